@@ -0,0 +1,121 @@
+# ajuste.py
+"""
+Núcleo numérico compartilhado pelos módulos do analyzer.
+
+Sem efeitos colaterais na importação: curvas.py roda como __main__ e os
+demais módulos (decomposicao, saturacao, live) importam daqui, nunca de curvas.
+"""
+import math
+import os
+
+from metodos_numericos import gauss_pivoteamento, jacobi, gauss_seidel
+
+INPUT_ROOT = os.getenv("INPUT_ROOT", "/app/input")
+OUTPUT_ROOT = os.getenv("OUTPUT_ROOT", "/app/output")
+
+def calcular_metricas_erro(y_true, y_pred):
+    """Calcula MAE, RMSE e R²."""
+    if len(y_true) != len(y_pred) or len(y_true) == 0:
+        return {'mae': 0, 'rmse': 0, 'r2': 0}
+    
+    n = len(y_true)
+    mae = sum(abs(a - b) for a, b in zip(y_true, y_pred)) / n
+    mse = sum((a - b)**2 for a, b in zip(y_true, y_pred)) / n
+    rmse = math.sqrt(mse)
+    
+    y_mean = sum(y_true) / n
+    ss_total = sum((a - y_mean)**2 for a in y_true)
+    ss_res = sum((a - b)**2 for a, b in zip(y_true, y_pred))
+    
+    r2 = 1 - (ss_res / ss_total) if ss_total != 0 else 0
+    
+    return {
+        'mae': mae,
+        'rmse': rmse,
+        'r2': r2
+    }
+
+def sistema_normal(A, y, pesos=None):
+    """Monta A^T W A e A^T W y para uma matriz de projeto A (W = I sem pesos)"""
+    k = len(A[0])
+    ATA = [[0.0]*k for _ in range(k)]
+    ATB = [0.0]*k
+    
+    # Preenchimento eficiente das matrizes (simétrica: só o triângulo superior)
+    if pesos is None:
+        for i in range(k):
+            for j in range(i, k):
+                ATA[i][j] = ATA[j][i] = sum(a[i] * a[j] for a in A)
+            ATB[i] = sum(a[i] * y_val for a, y_val in zip(A, y))
+    else:
+        for i in range(k):
+            for j in range(i, k):
+                ATA[i][j] = ATA[j][i] = sum(w * a[i] * a[j] for a, w in zip(A, pesos))
+            ATB[i] = sum(w * a[i] * y_val for a, y_val, w in zip(A, y, pesos))
+    
+    return ATA, ATB
+
+LAMBDA_RELATIVO = 1e-4  # Ridge proporcional à diagonal: invariante à escala das colunas
+
+def regularizar(ATA):
+    """
+    Regularização relativa à escala: A^T A + λ·diag(A^T A).
+    
+    Com colunas em unidades muito diferentes (KB/s ~1e5, bias = 1), um lambda
+    absoluto ou a imposição de dominância diagonal encolhem os parâmetros até
+    perderem o sentido. Colunas nulas recebem diagonal 1 (parâmetro zero).
+    """
+    ATA = [linha[:] for linha in ATA]
+    for i in range(len(ATA)):
+        ATA[i][i] = ATA[i][i] * (1 + LAMBDA_RELATIVO) if ATA[i][i] > 0 else 1.0
+    return ATA
+
+def resolver_sistema(ATA, ATB, metodo='gauss', x0=None):
+    """
+    Resolve o sistema normal com o método numérico escolhido (x0 = warm start).
+    
+    O sistema é equilibrado pela diagonal (S A S z = S b, S = diag(1/sqrt(a_ii)),
+    theta = S z), o que equivale a padronizar as colunas da matriz de projeto.
+    O amortecimento de Jacobi é limitado por Gershgorin para garantir
+    convergência sem alterar o sistema.
+    """
+    k = len(ATB)
+    s = [1 / math.sqrt(ATA[i][i]) if ATA[i][i] > 0 else 1.0 for i in range(k)]
+    A_eq = [[ATA[i][j] * s[i] * s[j] for j in range(k)] for i in range(k)]
+    b_eq = [ATB[i] * s[i] for i in range(k)]
+    z0 = [x0[i] / s[i] for i in range(k)] if x0 is not None else None
+    
+    # Seleção do método numérico com tratamento de erros
+    try:
+        if metodo == 'gauss':
+            z = gauss_pivoteamento(A_eq, b_eq)
+        elif metodo == 'jacobi':
+            raio = max(sum(abs(v) for v in linha) for linha in A_eq)  # Limita o espectro de D^-1 A
+            z = jacobi(A_eq, b_eq, x0=z0, damping=min(0.8, 1.9 / raio))
+        elif metodo == 'gauss_seidel':
+            z = gauss_seidel(A_eq, b_eq, x0=z0)
+        else:
+            raise ValueError(f"Método desconhecido: {metodo}")
+    except Exception as e:
+        print(f"Erro no método {metodo}: {str(e)}")
+        z = [0] * k
+    
+    return [zi * si for zi, si in zip(z, s)]
+
+def ajuste_tempo_por_kb(kb, t, metodo='gauss'):
+    """Ajuste t = s_por_kb * KB + fixo_s pelas equações normais 2x2 (sem regularização)"""
+    solvers = {'gauss': gauss_pivoteamento, 'jacobi': jacobi, 'gauss_seidel': gauss_seidel}
+    n = len(kb)
+    soma_x = sum(kb)
+    ATA = [[sum(x * x for x in kb), soma_x], [soma_x, n]]
+    ATB = [sum(x * ti for x, ti in zip(kb, t)), sum(t)]
+    beta = solvers[metodo](ATA, ATB)
+    
+    metricas = calcular_metricas_erro(t, [beta[0] * x + beta[1] for x in kb])
+    return {
+        's_por_kb': beta[0],
+        'fixo_s': beta[1],
+        'media_s': sum(t) / n,
+        'rmse': metricas['rmse'],
+        'r2': metricas['r2']
+    }
@@ -5,9 +5,25 @@ from sklearn.preprocessing import StandardScaler
 import matplotlib.pyplot as plt
 import os
 import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem flock, o lock vira no-op
+    fcntl = None
+
+from modelo import FEATURES, FEATURES_CLUSTER, centroide_mais_proximo, colunas_cluster
 
 os.environ["LOKY_MAX_CPU_COUNT"] = "4"
 
+FEATURE_WINDOW = float(os.getenv("FEATURE_WINDOW", "1.0"))  # segundos
+CLUSTER_INDEX = os.getenv(
+    "CLUSTER_INDEX", os.path.join(os.getenv("OUTPUT_ROOT", "/app/output"), "indice_clusters.json")
+)
+DRIFT_THRESHOLD = float(os.getenv("DRIFT_THRESHOLD", "0.25"))  # Aumento relativo da inércia mediana
+RUIDO_DERIVA = 6.0  # ~2 desvios da deriva entre amostras da mesma distribuição: 6/√n
+
 print("=== INICIANDO CLUSTERING ===", flush=True)
 
 def load_logs(log_file='/app/input/requests_log.json'):
@@ -25,42 +41,269 @@ def load_logs(log_file='/app/input/requests_log.json'):
     
     raise FileNotFoundError("Arquivo de logs não encontrado após todas as tentativas")
 
-def preprocess_logs(logs):
+def normalizar_registro(log):
+    """Extrai (tamanho KB, latência s) de um registro com limites físicos"""
+    # Validação e normalização robusta (tamanho entregue, quando registrado)
+    fs = log.get('file_size', 0)
+    if log.get('bytes_received'):
+        fs = log['bytes_received'] / 1024
+    et = log.get('elapsed_time', 0)
+    
+    # Normalização defensiva
+    size = float(fs) if fs not in [None, ""] else 0.1
+    latency = float(et) if et not in [None, ""] else 0.001
+    
+    # Aplicação de limites físicos realistas
+    size = max(0.1, min(size, 100000))  # Entre 0.1KB e 100MB
+    latency = max(0.001, min(latency, 300))  # Entre 1ms e 5min
+    return size, latency
+
+def features_carga(logs, janela=FEATURE_WINDOW):
+    """
+    Features de carga no instante de envio de cada requisição.
+    
+    Metodologia:
+    1. Inícios (envio planejado ou efetivo) e fins (início + latência) ordenados
+    2. Em voo: inícios anteriores menos fins já ocorridos (duas buscas binárias)
+    3. Req/s e KB/s: contagem e soma acumulada dos envios em (t - janela, t]
+    
+    Parâmetros:
+    logs - Lista de registros brutos
+    janela - Largura da janela deslizante em segundos
+    
+    Retorna:
+    F - Array (n x 3) [em_voo, req_s, kb_s]; zeros para registros sem send_time
+    """
+    n = len(logs)
+    F = np.zeros((n, 3))
+    validos = np.array([l.get('send_time') is not None for l in logs], dtype=bool)
+    if not validos.any():
+        print("⚠ Logs sem send_time: features de carga zeradas", flush=True)
+        return F
+    
+    registros = [l for l, v in zip(logs, validos) if v]
+    inicio = np.array([l.get('intended_time', l['send_time']) for l in registros], dtype=float)
+    fim = inicio + np.array([l.get('elapsed_time') or 0.0 for l in registros], dtype=float)
+    kb = np.array([normalizar_registro(l)[0] for l in registros])
+    
+    ordem = np.argsort(inicio, kind='stable')
+    inicios = inicio[ordem]
+    fins = np.sort(fim)
+    kb_acumulado = np.concatenate(([0.0], np.cumsum(kb[ordem])))
+    
+    em_voo = np.searchsorted(inicios, inicio, 'left') - np.searchsorted(fins, inicio, 'right')
+    ate_t = np.searchsorted(inicios, inicio, 'right')
+    antes_janela = np.searchsorted(inicios, inicio - janela, 'right')
+    
+    F[validos, 0] = np.maximum(em_voo, 0)
+    F[validos, 1] = (ate_t - antes_janela) / janela
+    F[validos, 2] = (kb_acumulado[ate_t] - kb_acumulado[antes_janela]) / janela
+    return F
+
+class IndiceClusters:
+    """
+    Índice persistido de clusters: scaler, centroides e inércia de referência.
+    
+    Logs novos são rotulados pelo centroide mais próximo (O(n·k), em blocos),
+    sem refazer o K-Means, e os ids de cluster ficam comparáveis entre
+    experimentos. O reajuste só acontece quando a inércia mediana dos dados
+    novos sobe mais que DRIFT_THRESHOLD em relação à do ajuste original.
+    
+    Distância e inércia usam só FEATURES_CLUSTER: em voo, req/s e KB/s mudam
+    entre experimentos por construção e disparariam um reajuste a cada um.
+    
+    Cada ajuste é gravado num arquivo imutável indice_clusters.<versão>.json;
+    CLUSTER_INDEX aponta para o atual. Assim o campo indice_clusters de um
+    modelo.json antigo continua resolvível depois de um reajuste.
+    """
+    VERSAO = 1
+    
+    def __init__(self, media, escala, centroides, inercia_base, n_pontos,
+                 experimento=None, criado_em=None):
+        self.media = np.asarray(media, dtype=float)
+        self.escala = np.asarray(escala, dtype=float)
+        self.centroides = np.asarray(centroides, dtype=float)
+        self.inercia_base = inercia_base
+        self.n_pontos = n_pontos
+        self.experimento = experimento
+        self.criado_em = criado_em or datetime.now().isoformat()
+    
+    @property
+    def versao_id(self):
+        """criado_em sem separadores, usável em nome de arquivo (20261019T031502123456)"""
+        return ''.join(c for c in self.criado_em if c.isalnum())
+    
+    @classmethod
+    def ajustar(cls, X, experimento=None):
+        """K-Means completo (n_init=10) sobre FEATURES_CLUSTER padronizadas; ids em ordem crescente de tamanho"""
+        X = np.asarray(X, dtype=float)
+        n_clusters = min(5, len(X)//100)
+        if n_clusters < 1:
+            raise ValueError(f"Pontos insuficientes para clusterizar ({len(X)})")
+        
+        # Padronização: inércia adimensional, comparável com a do índice gravado
+        scaler = StandardScaler()
+        X_scaled = scaler.fit_transform(colunas_cluster(X))
+        kmeans = MiniBatchKMeans(n_clusters=n_clusters, n_init=10, random_state=42)
+        kmeans.fit(X_scaled)
+        
+        # Ordem canônica: o mesmo id designa a mesma faixa de tamanho após um reajuste
+        centroides = kmeans.cluster_centers_[np.argsort(kmeans.cluster_centers_[:, 0])]
+        indice = cls(scaler.mean_, scaler.scale_, centroides, 0.0, len(X), experimento)
+        indice.inercia_base = float(np.median(indice.atribuir(X)[1]))
+        return indice
+    
+    @classmethod
+    def carregar(cls, caminho=CLUSTER_INDEX, versao=None):
+        """
+        Índice atual, ou a versão pedida (versao_id ou criado_em de um modelo.json).
+        
+        Retorna None se o arquivo não existir ou for de outro formato.
+        """
+        if versao is not None:
+            caminho = caminho_versao(caminho, ''.join(c for c in versao if c.isalnum()))
+        if not os.path.exists(caminho):
+            return None
+        with open(caminho) as f:
+            dados = json.load(f)
+        if dados.get('versao') != cls.VERSAO or dados.get('features') != FEATURES_CLUSTER:
+            print(f"⚠ Índice de clusters incompatível em {caminho}; será refeito", flush=True)
+            return None
+        return cls(dados['media'], dados['escala'], dados['centroides'], dados['inercia_base'],
+                   dados['n_pontos'], dados.get('experimento'), dados['criado_em'])
+    
+    def salvar(self, caminho=CLUSTER_INDEX):
+        """Grava a versão imutável e depois atualiza o ponteiro; retorna o caminho da versão"""
+        os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        dados = {
+            'versao': self.VERSAO,
+            'versao_id': self.versao_id,
+            'criado_em': self.criado_em,
+            'experimento': self.experimento,
+            'features': FEATURES_CLUSTER,
+            'n_pontos': self.n_pontos,
+            'media': self.media.tolist(),
+            'escala': self.escala.tolist(),
+            'centroides': self.centroides.tolist(),
+            'inercia_base': self.inercia_base
+        }
+        versionado = caminho_versao(caminho, self.versao_id)
+        for destino in (versionado, caminho):
+            tmp = f"{destino}.{os.getpid()}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump(dados, f, indent=4)
+            os.replace(tmp, destino)  # Leitores concorrentes nunca veem arquivo parcial
+        return versionado
+    
+    def atribuir(self, X):
+        """(rótulos, distância quadrática) de cada linha de X (colunas na ordem de FEATURES)"""
+        return centroide_mais_proximo(colunas_cluster(X), self.media, self.escala, self.centroides)
+    
+    def deriva(self, dist2):
+        """Aumento relativo da inércia mediana (a média seria dominada pela cauda de arquivos grandes)"""
+        mediana = float(np.median(dist2))
+        if self.inercia_base <= 0:
+            return 0.0 if mediana <= 0 else float('inf')
+        return mediana / self.inercia_base - 1
+    
+    def limiar_efetivo(self, limiar, n):
+        """Limiar mais a margem de amostragem da mediana (a menor amostra manda)"""
+        return limiar + RUIDO_DERIVA / np.sqrt(max(1, min(n, self.n_pontos)))
+
+def caminho_versao(caminho, versao_id):
+    """indice_clusters.json -> indice_clusters.<versao_id>.json"""
+    base, ext = os.path.splitext(caminho)
+    return f"{base}.{versao_id}{ext}"
+
+@contextmanager
+def bloqueio_exclusivo(caminho):
+    """Lock exclusivo entre processos (flock em <caminho>.lock)"""
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    with open(caminho + ".lock", 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+def _tentar_indice(X, caminho, limiar):
+    """(rótulos, índice, deriva); rótulos é None se não houver índice ou se ele derivou"""
+    indice = IndiceClusters.carregar(caminho)
+    if indice is None:
+        return None, None, None
+    rotulos, dist2 = indice.atribuir(X)
+    deriva = indice.deriva(dist2)
+    if deriva > indice.limiar_efetivo(limiar, len(dist2)):
+        return None, indice, deriva
+    print(f"✓ Índice de clusters reaproveitado ({indice.experimento}, deriva {deriva:+.1%})", flush=True)
+    return rotulos, indice, deriva
+
+def rotular_com_indice(X, caminho=CLUSTER_INDEX, limiar=DRIFT_THRESHOLD):
+    """
+    Rotula X pelo índice persistido, reajustando-o apenas sob deriva.
+    
+    O caminho comum (índice serve) não trava. O reajuste roda sob lock e
+    relê o índice antes: se outro analyzer acabou de reajustar e o novo
+    índice serve, ele é reaproveitado em vez de sobrescrito.
+    
+    Parâmetros:
+    X - Features [tamanho, em_voo, req_s, kb_s] sem padronização
+    caminho - Arquivo JSON do índice atual (ponteiro)
+    limiar - Aumento relativo de inércia que dispara o reajuste (somado à margem
+             de amostragem RUIDO_DERIVA/√n, relevante em execuções pequenas)
+    
+    Retorna:
+    rotulos - Array de ids de cluster
+    indice - IndiceClusters usado (novo ou reaproveitado)
+    """
+    rotulos, indice, _ = _tentar_indice(X, caminho, limiar)
+    if rotulos is not None:
+        return rotulos, indice
+    
+    with bloqueio_exclusivo(caminho):
+        rotulos, indice, deriva = _tentar_indice(X, caminho, limiar)
+        if rotulos is not None:
+            return rotulos, indice
+        if deriva is not None:
+            limite = indice.limiar_efetivo(limiar, len(X))
+            print(f"⚠ Deriva de inércia {deriva:+.1%} acima de {limite:.0%}: reajustando clusters", flush=True)
+        
+        indice = IndiceClusters.ajustar(X, os.getenv("EXPERIMENT_ID", "default"))
+        versionado = indice.salvar(caminho)
+    print(f"✓ Índice de clusters gravado em {versionado} ({len(indice.centroides)} clusters)", flush=True)
+    return indice.atribuir(X)[0], indice
+
+def preprocess_logs(logs, retornar_modelo=False):
     """
     Pré-processamento de logs com validação robusta e clusterização adaptativa.
     
     Metodologia:
     1. Limpeza e normalização de dados
     2. Validação de limites físicos
-    3. Clusterização dinâmica baseada na densidade dos dados
+    3. Features de carga por janela deslizante (a latência é apenas o alvo)
+    4. Rótulos pelo índice de clusters persistido (reajuste só sob deriva)
     
     Parâmetros:
     logs - Lista de registros brutos
+    retornar_modelo - Se True, retorna também o modelo de clusters
     
     Retorna:
-    X - Dados pré-processados [tamanho, latência]
+    X - Dados pré-processados [tamanho, em_voo, req_s, kb_s]
     clusters - Rótulos de cluster atribuídos
     y - Valores de latência processados
+    modelo - IndiceClusters usado, ou None (apenas com retornar_modelo)
     """
     X = []
     y = []
     invalid_count = 0
 
-    for log in logs:
+    carga = features_carga(logs)
+    for log, f in zip(logs, carga):
         try:
-            # Validação e normalização robusta
-            fs = log.get('file_size', 0)
-            et = log.get('elapsed_time', 0)
-            
-            # Normalização defensiva
-            size = float(fs) if fs not in [None, ""] else 0.1
-            latency = float(et) if et not in [None, ""] else 0.001
-            
-            # Aplicação de limites físicos realistas
-            size = max(0.1, min(size, 100000))  # Entre 0.1KB e 100MB
-            latency = max(0.001, min(latency, 300))  # Entre 1ms e 5min
-            
-            X.append([size, latency])
+            size, latency = normalizar_registro(log)
+            X.append([size, *f.tolist()])
             y.append(latency)
             
         except Exception as e:
@@ -68,27 +311,28 @@ def preprocess_logs(logs):
             
     # Clusterização adaptativa por densidade
     if len(X) < 10:
-        return [], [], y
+        resultado = ([], [], y)
+        return resultado + (None,) if retornar_modelo else resultado
     
     try:
-        # Determinação dinâmica do número de clusters
-        n_clusters = min(5, len(X)//100)
-        kmeans = MiniBatchKMeans(
-            n_clusters=n_clusters,
-            n_init=10,
-            random_state=42
-        )
-        clusters = kmeans.fit_predict(X)
-        return X, clusters.tolist(), y
+        clusters, modelo = rotular_com_indice(X)
+        resultado = (X, clusters.tolist(), y)
     except Exception as e:
-        return X, [0]*len(X), y
+        resultado = (X, [0]*len(X), y)
+        modelo = None
+    
+    return resultado + (modelo,) if retornar_modelo else resultado
     
 def apply_clustering(X):
-    """Clustering otimizado para grandes datasets"""
+    """Clustering otimizado para grandes datasets (usa o índice persistido quando compatível)"""
     from sklearn.cluster import MiniBatchKMeans
     
     if len(X) < 10:
         return [0] * len(X)  # Retorna cluster único
+    
+    indice = IndiceClusters.carregar()
+    if indice is not None and np.ndim(X) == 2 and np.shape(X)[1] == len(FEATURES):
+        return indice.atribuir(X)[0].tolist()
         
     # Determina número máximo de clusters
     n_clusters = min(5, len(X)//10)  # Máximo 5 clusters
@@ -3,42 +3,31 @@ import time
 import json
 import os
 import math
+import random
+import statistics
 import traceback
-from metodos_numericos import gauss_pivoteamento, jacobi, gauss_seidel
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from ajuste import (
+    INPUT_ROOT, OUTPUT_ROOT, calcular_metricas_erro, sistema_normal,
+    regularizar, resolver_sistema, ajuste_tempo_por_kb
+)
 from clustering import preprocess_logs, apply_clustering
+from modelo import prever_linear, salvar_modelo
+from decomposicao import analisar_decomposicao
+from saturacao import carregar_rampa, analisar_saturacao
 
 print("=== INICIANDO AJUSTE DE CURVAS ===", flush=True)
 
-# Função nova para cálculo de métricas de erro
-def calcular_metricas_erro(y_true, y_pred):
-    """Calcula MAE, RMSE e R²."""
-    if len(y_true) != len(y_pred) or len(y_true) == 0:
-        return {'mae': 0, 'rmse': 0, 'r2': 0}
-    
-    n = len(y_true)
-    mae = sum(abs(a - b) for a, b in zip(y_true, y_pred)) / n
-    mse = sum((a - b)**2 for a, b in zip(y_true, y_pred)) / n
-    rmse = math.sqrt(mse)
-    
-    y_mean = sum(y_true) / n
-    ss_total = sum((a - y_mean)**2 for a in y_true)
-    ss_res = sum((a - b)**2 for a, b in zip(y_true, y_pred))
-    
-    r2 = 1 - (ss_res / ss_total) if ss_total != 0 else 0
-    
-    return {
-        'mae': mae,
-        'rmse': rmse,
-        'r2': r2
-    }
-
 # Função nova para validação dos resultados
-def validar_resultados(resultados):
+def validar_resultados(resultados, cv=None):
     """Realiza validação cruzada dos resultados obtidos."""
     relatorio = {
         'checks': [],
         'metodos_comparacao': {}
     }
+    if cv is not None:
+        relatorio['validacao_cruzada'] = cv
     
     metodos = [m for m in resultados if resultados[m]['erro'] is None]
     
@@ -65,12 +54,27 @@ def validar_resultados(resultados):
         except:
             pass
     
+    # Sobreajuste: erro fora da amostra muito acima do erro dentro da amostra
+    for metodo in metodos:
+        if cv is None or metodo not in cv.get('metodos', {}):
+            continue
+        cv_rmse = cv['metodos'][metodo]['cv_rmse_medio']
+        rmse = resultados[metodo]['rmse']
+        razao = cv_rmse / rmse if rmse > 0 else float('inf')
+        relatorio['checks'].append({
+            'check': f"Validação cruzada ({metodo}{', ' + cv['perda'] if cv.get('perda') else ''})",
+            'status': 'OK' if razao <= 1.2 else 'ALERTA',
+            'detalhes': f"RMSE {cv['k']}-fold = {cv_rmse:.4f} ± "
+                        f"{cv['metodos'][metodo]['cv_rmse_desvio']:.4f} "
+                        f"({razao:.2f}x o RMSE na amostra, <= 1.2 considerado bom)"
+        })
+    
     return relatorio
 
-def carregar_dados():
-    """Carrega dados do experimento atual"""
+def carregar_logs():
+    """Carrega os logs brutos do experimento atual"""
     experiment_id = os.getenv("EXPERIMENT_ID", "default")
-    caminho = f"/app/input/{experiment_id}/requests_log.json"
+    caminho = os.path.join(INPUT_ROOT, experiment_id, "requests_log.json")
     
     print(f"DEBUG: Buscando dados em {caminho}")
     
@@ -78,8 +82,18 @@ def carregar_dados():
         with open(caminho, 'r') as f:
             logs = json.load(f)
         print(f"✓ Registros brutos: {len(logs)}")
-        
-        X_raw, clusters, y = preprocess_logs(logs)
+        return logs
+    except Exception as e:
+        print(f"ERRO: Falha ao carregar logs ({str(e)})")
+        exit(1)
+
+def carregar_dados(logs=None):
+    """Carrega dados do experimento atual"""
+    if logs is None:
+        logs = carregar_logs()
+    
+    try:
+        X_raw, clusters, y, modelo_clusters = preprocess_logs(logs, retornar_modelo=True)
         
         # Verificações detalhadas
         print(f"[DEBUG] Tamanho de X_raw: {len(X_raw)}")
@@ -94,9 +108,9 @@ def carregar_dados():
             raise ValueError(f"Inconsistência: X_raw ({len(X_raw)}) vs y ({len(y)})")
             
         # Combinação correta das características
-        X = [[x[0], x[1], clusters[i]] for i, x in enumerate(X_raw)]
+        X = [list(x) + [clusters[i]] for i, x in enumerate(X_raw)]
         
-        return X, y
+        return X, y, modelo_clusters
         
     except Exception as e:
         print(f"ERRO: Falha ao carregar dados ({str(e)})")
@@ -108,59 +122,142 @@ def ajuste_minimos_quadrados(X, y, metodo='gauss'):
     
     Metodologia:
     1. Construção da matriz de projeto com termo de bias
-    2. Regularização adaptativa baseada na escala do problema
+    2. Regularização relativa à escala de cada coluna (ridge λ·diag)
     3. Seleção de método numérico com tratamento de erros
     
     Parâmetros:
-    X - Matriz de características [tamanho, taxa, cluster]
+    X - Matriz de características [tamanho, em_voo, req_s, kb_s, cluster]
     y - Vetor de valores observados
     metodo - Algoritmo numérico a ser utilizado
     
     Retorna:
-    theta - Parâmetros do modelo ajustado
+    theta - Parâmetros do modelo ajustado (bias por último)
     """
     n = len(X)
     if n < 4:
         raise ValueError("Número insuficiente de pontos para ajuste")
     
     # Construção da matriz de projeto aumentada
-    A = [[row[0], row[1], row[2], 1] for row in X]
+    A = [list(row) + [1] for row in X]
     
     # Construção do sistema normal equations
-    ATA = [[0.0]*4 for _ in range(4)]
-    ATB = [0.0]*4
-    
-    # Preenchimento eficiente das matrizes
-    for i in range(4):
-        for j in range(4):
-            ATA[i][j] = sum(a[i] * a[j] for a in A)
-        ATB[i] = sum(a[i] * y_val for a, y_val in zip(A, y))
-    
-    # Regularização adaptativa com controle de condicionamento
-    lambda_reg_value = 1e-1 * n
-    for i in range(4):
-        ATA[i][i] += lambda_reg_value
-        row_sum = sum(abs(ATA[i][j]) for j in range(4) if j != i)
-        if ATA[i][i] < row_sum:
-            ATA[i][i] += row_sum * 1.1  # Garante dominância diagonal
-    
-    # Seleção do método numérico com tratamento de erros
-    try:
-        if metodo == 'gauss':
-            theta = gauss_pivoteamento(ATA, ATB)
-        elif metodo == 'jacobi':
-            theta = jacobi(ATA, ATB)
-        elif metodo == 'gauss_seidel':
-            theta = gauss_seidel(ATA, ATB)
+    ATA, ATB = sistema_normal(A, y)
+    
+    # Regularização relativa à escala de cada coluna
+    ATA = regularizar(ATA)
+    
+    return resolver_sistema(ATA, ATB, metodo)
+
+# Constantes de ajuste com 95% de eficiência assintótica sob erro normal
+PERDAS_ROBUSTAS = {'huber': 1.345, 'tukey': 4.685}
+
+def pesos_robustos(residuos, perda='huber'):
+    """Pesos IRLS a partir dos resíduos padronizados pela MAD"""
+    c = PERDAS_ROBUSTAS[perda]
+    mediana = statistics.median(residuos)
+    desvios = [abs(r - mediana) for r in residuos]
+    escala = statistics.median(desvios) / 0.6745
+    if escala < 1e-12:
+        # MAD nula (mais da metade dos resíduos iguais): usa o desvio absoluto médio
+        escala = statistics.fmean(desvios) * 1.2533
+    if escala < 1e-12:
+        return None  # Resíduos degenerados: nada a reponderar
+    
+    pesos = []
+    for r in residuos:
+        u = abs(r) / escala
+        if perda == 'huber':
+            pesos.append(1.0 if u <= c else c / u)
         else:
-            raise ValueError(f"Método desconhecido: {metodo}")
-    except Exception as e:
-        print(f"Erro no método {metodo}: {str(e)}")
-        theta = [0, 0, 0, 0]
+            pesos.append((1 - (u / c) ** 2) ** 2 if u < c else 0.0)
+    return pesos
+
+def ajuste_robusto(X, y, metodo='gauss', perda='huber', max_iter=20, tol=1e-8):
+    """
+    Ajuste robusto (Huber ou Tukey) por mínimos quadrados iterativamente reponderados.
+    
+    Metodologia:
+    1. Matriz de projeto montada uma única vez; ponto de partida = ajuste ordinário
+    2. A cada iteração, pesos a partir dos resíduos escalados pela MAD
+    3. Só a matriz de Gram ponderada é reconstruída; Jacobi e Gauss-Seidel
+       partem do iterado anterior (warm start) e convergem em poucos passos
+    
+    Parâmetros:
+    X - Matriz de características [tamanho, em_voo, req_s, kb_s, cluster]
+    y - Vetor de valores observados
+    metodo - Algoritmo numérico a ser utilizado
+    perda - 'huber' ou 'tukey'
+    max_iter - Número máximo de iterações IRLS
+    tol - Tolerância relativa na variação dos parâmetros
+    
+    Retorna:
+    theta - Parâmetros do modelo ajustado
+    """
+    if perda not in PERDAS_ROBUSTAS:
+        raise ValueError(f"Perda desconhecida: {perda}")
+    
+    n = len(X)
+    if n < 4:
+        raise ValueError("Número insuficiente de pontos para ajuste")
+    
+    A = [list(row) + [1] for row in X]
+    ATA, ATB = sistema_normal(A, y)
+    theta = resolver_sistema(regularizar(ATA), ATB, metodo)
+    
+    for _ in range(max_iter):
+        residuos = [y_val - sum(t * a_i for t, a_i in zip(theta, a)) for a, y_val in zip(A, y)]
+        pesos = pesos_robustos(residuos, perda)
+        if pesos is None:
+            break
+        
+        ATA, ATB = sistema_normal(A, y, pesos)
+        theta_novo = resolver_sistema(regularizar(ATA), ATB, metodo, x0=theta)
+        
+        variacao = max(abs(a - b) for a, b in zip(theta_novo, theta))
+        theta = theta_novo
+        if variacao <= tol * max(1.0, max(abs(t) for t in theta)):
+            break
     
     return theta
 
-def comparar_metodos(X, y):
+def ajuste_fases(logs, metodo='gauss'):
+    """
+    Ajusta separadamente o tempo de transferência e o overhead fixo por requisição.
+    
+    Metodologia:
+    1. Seleção das requisições bem-sucedidas com fases registradas pelo cliente
+    2. Transferência: t_transf = beta1 * KB_entregues + beta0 (mínimos quadrados)
+    3. Overhead (conexão + TTFB): mesmo modelo, separado da transferência
+    
+    Parâmetros:
+    logs - Registros brutos do cliente
+    metodo - Algoritmo numérico para as equações normais 2x2
+    
+    Retorna:
+    fases - Dicionário com parâmetros e métricas por fase (None sem dados de fase)
+    """
+    registros = [
+        l for l in logs
+        if l.get('status_code') == 200 and l.get('bytes_received') and l.get('transfer_time') is not None
+    ]
+    if len(registros) < 4:
+        return None
+    
+    kb = [l['bytes_received'] / 1024 for l in registros]
+    componentes = {
+        'transferencia': [l['transfer_time'] for l in registros],
+        'overhead': [l['connect_time'] + l['ttfb'] for l in registros]
+    }
+    
+    fases = {'pontos': len(kb), 'metodo': metodo}
+    for nome, t in componentes.items():
+        fases[nome] = ajuste_tempo_por_kb(kb, t, metodo)
+    
+    s_por_kb = fases['transferencia']['s_por_kb']
+    fases['vazao_kb_s'] = 1 / s_por_kb if s_por_kb > 0 else None
+    return fases
+
+def comparar_metodos(X, y, perda=None):
     """
     Rotina de comparação sistemática de métodos numéricos.
     
@@ -173,22 +270,28 @@ def comparar_metodos(X, y):
     Parâmetros:
     X - Dados de entrada
     y - Valores observados
+    perda - 'huber'/'tukey' para ajuste robusto (IRLS); None = mínimos quadrados
     
     Retorna:
     resultados - Dicionário com métricas comparativas
     """
     metodos = ['gauss', 'jacobi', 'gauss_seidel']
     resultados = {}
+    X_arr = np.asarray(X, dtype=float)
+    y_arr = np.asarray(y, dtype=float)
     
     for metodo in metodos:
         try:
             # Validação inicial dos dados
-            if not X or any(len(row) != 3 for row in X):
+            if not X or len({len(row) for row in X}) != 1:
                 raise ValueError("Dados de entrada inválidos")
             
             # Execução cronometrada
             inicio = time.time()
-            theta = ajuste_minimos_quadrados(X, y, metodo)
+            if perda:
+                theta = ajuste_robusto(X, y, metodo, perda)
+            else:
+                theta = ajuste_minimos_quadrados(X, y, metodo)
             
             # Verificação de sanidade dos parâmetros
             if any(not math.isfinite(t) for t in theta):
@@ -199,27 +302,11 @@ def comparar_metodos(X, y):
             
             tempo = time.time() - inicio
             
-            # Cálculo das predições com filtragem de valores inválidos
-            y_pred = []
-            y_true_valid = []
-            invalid_count = 0
-            
-            for i, x_row in enumerate(X):
-                try:
-                    pred = (theta[0] * x_row[0] + 
-                            theta[1] * x_row[1] + 
-                            theta[2] * x_row[2] + 
-                            theta[3])
-                    
-                    if not math.isfinite(pred):
-                        invalid_count += 1
-                        continue
-                        
-                    y_pred.append(pred)
-                    y_true_valid.append(y[i])
-                
-                except Exception as e:
-                    invalid_count += 1
+            # Cálculo vetorizado das predições com filtragem de valores inválidos
+            pred = prever_linear(theta, X_arr)
+            validos = np.isfinite(pred)
+            y_pred = pred[validos].tolist()
+            y_true_valid = y_arr[validos].tolist()
             
             # Cálculo das métricas de erro
             metricas = calcular_metricas_erro(y_true_valid, y_pred)
@@ -238,7 +325,7 @@ def comparar_metodos(X, y):
         except Exception as e:
             # Tratamento completo de erros
             resultados[metodo] = {
-                'theta': [0, 0, 0, 0],
+                'theta': [0] * (len(X[0]) + 1 if X else 1),
                 'tempo': -1,
                 'mae': -1,
                 'rmse': -1,
@@ -249,6 +336,87 @@ def comparar_metodos(X, y):
     
     return resultados
 
+def _resolver_fold(ATA, ATB, metodo):
+    """Tarefa paralela: resolve o sistema de treino de um fold"""
+    return resolver_sistema(regularizar(ATA), ATB, metodo)
+
+def _ajustar_fold_robusto(X_treino, y_treino, metodo, perda):
+    """Tarefa paralela: IRLS completo sobre o treino de um fold"""
+    return ajuste_robusto(X_treino, y_treino, metodo, perda)
+
+def validacao_cruzada(X, y, k=5, metodos=('gauss', 'jacobi', 'gauss_seidel'), seed=42, perda=None):
+    """
+    Validação cruzada k-fold com downdating das equações normais.
+    
+    Metodologia:
+    1. A^T A e A^T y de cada fold são calculados uma única vez
+    2. O sistema de treino de cada fold é o total menos a contribuição do fold,
+       sem reconstruir a matriz de Gram a partir dos dados
+    3. Os k x métodos sistemas são resolvidos em paralelo (processos)
+    4. RMSE de cada fold medido nos pontos que ficaram de fora
+    5. Com perda robusta, cada fold refaz o IRLS no treino (os pesos mudam a
+       matriz de Gram, então não há downdating), para validar o mesmo
+       estimador cujo RMSE na amostra é comparado
+    
+    Parâmetros:
+    X - Matriz de características [tamanho, em_voo, req_s, kb_s, cluster]
+    y - Vetor de valores observados
+    k - Número de folds
+    metodos - Métodos numéricos avaliados
+    seed - Semente do embaralhamento dos folds
+    perda - 'huber'/'tukey' se o ajuste principal foi robusto; None = mínimos quadrados
+    
+    Retorna:
+    cv - Dicionário com RMSE médio, desvio e RMSE por fold para cada método
+    """
+    n = len(X)
+    if n < 4 * k:
+        raise ValueError(f"Pontos insuficientes para {k}-fold ({n})")
+    
+    A = [list(row) + [1] for row in X]
+    indices = list(range(n))
+    random.Random(seed).shuffle(indices)
+    folds = [indices[f::k] for f in range(k)]
+    
+    sistemas = [sistema_normal([A[i] for i in fold], [y[i] for i in fold]) for fold in folds]
+    dim = len(A[0])
+    ATA_total = [[sum(s[0][i][j] for s in sistemas) for j in range(dim)] for i in range(dim)]
+    ATB_total = [sum(s[1][i] for s in sistemas) for i in range(dim)]
+    
+    with ProcessPoolExecutor(max_workers=min(k * len(metodos), os.cpu_count() or 1)) as executor:
+        tarefas = {}
+        for f, (ATA_f, ATB_f) in enumerate(sistemas):
+            ATA_treino = [[ATA_total[i][j] - ATA_f[i][j] for j in range(dim)] for i in range(dim)]
+            ATB_treino = [ATB_total[i] - ATB_f[i] for i in range(dim)]
+            if perda:
+                fora = set(folds[f])
+                treino = [i for i in range(n) if i not in fora]
+                X_treino, y_treino = [X[i] for i in treino], [y[i] for i in treino]
+            for metodo in metodos:
+                if perda:
+                    tarefas[(f, metodo)] = executor.submit(
+                        _ajustar_fold_robusto, X_treino, y_treino, metodo, perda
+                    )
+                else:
+                    tarefas[(f, metodo)] = executor.submit(
+                        _resolver_fold, ATA_treino, ATB_treino, metodo
+                    )
+        thetas = {chave: tarefa.result() for chave, tarefa in tarefas.items()}
+    
+    cv = {'k': k, 'perda': perda, 'metodos': {}}
+    for metodo in metodos:
+        rmses = []
+        for f, fold in enumerate(folds):
+            theta = thetas[(f, metodo)]
+            y_pred = [sum(t * a for t, a in zip(theta, A[i])) for i in fold]
+            rmses.append(calcular_metricas_erro([y[i] for i in fold], y_pred)['rmse'])
+        cv['metodos'][metodo] = {
+            'cv_rmse_medio': statistics.fmean(rmses),
+            'cv_rmse_desvio': statistics.stdev(rmses),
+            'cv_rmse_folds': rmses
+        }
+    return cv
+
 def plot_resultados(X, y, resultados, caminho_saida):
     """Salva os gráficos em arquivo."""
     plt.figure(figsize=(15, 10))
@@ -260,12 +428,12 @@ def plot_resultados(X, y, resultados, caminho_saida):
     # Gráfico 3D
     ax1 = plt.subplot(121, projection='3d')
     x1 = [row[0] for row in X]
-    x2 = [row[1] for row in X]
-    clusters = [row[2] for row in X]
+    x2 = [row[2] for row in X]
+    clusters = [row[-1] for row in X]
     
     ax1.scatter(x1, x2, y, c=clusters, cmap='viridis')
     ax1.set_xlabel('Tamanho (KB)')
-    ax1.set_ylabel('Req/min')
+    ax1.set_ylabel('Req/s (janela)')
     ax1.set_zlabel('Latência (ms)')
     
     # Gráfico de Métricas
@@ -294,14 +462,17 @@ def plot_resultados(X, y, resultados, caminho_saida):
 if __name__ == "__main__":
     print("=== INICIANDO ANALYZER ===")
     experiment_id = os.getenv("EXPERIMENT_ID", "default")
-    output_dir = os.path.join("/app/output", experiment_id)
+    perda = os.getenv("ROBUST_LOSS") or None  # huber | tukey
+    cv_folds = int(os.getenv("CV_FOLDS", "5"))  # 0 desativa a validação cruzada
+    output_dir = os.path.join(OUTPUT_ROOT, experiment_id)
     
     try:
         os.makedirs(output_dir, exist_ok=True)
         
         # Carregar e processar dados
-        X, y = carregar_dados()
-        resultados = comparar_metodos(X, y)
+        logs = carregar_logs()
+        X, y, modelo_clusters = carregar_dados(logs)
+        resultados = comparar_metodos(X, y, perda)
         
         # Salvar métricas
         with open(f"{output_dir}/metricas.txt", 'w') as f:
@@ -316,11 +487,58 @@ if __name__ == "__main__":
                     f"Tempo: {res['tempo']:.4f}s\n\n"
                 )
         
+        # Artefato do modelo: melhor método (menor RMSE) + clusters
+        validos = [m for m in resultados if resultados[m]['erro'] is None]
+        if validos:
+            melhor = min(validos, key=lambda m: resultados[m]['rmse'])
+            salvar_modelo(
+                f"{output_dir}/modelo.json", resultados[melhor]['theta'], melhor,
+                modelo_clusters, experiment_id,
+                {k: resultados[melhor][k] for k in ('mae', 'rmse', 'r2')}
+            )
+        
+        # Decomposição transferência x overhead (logs com fases)
+        fases = ajuste_fases(logs)
+        if fases is not None:
+            with open(f"{output_dir}/fases.json", 'w') as f:
+                json.dump(fases, f, indent=4)
+            print(f"✓ Vazão estimada: {fases['vazao_kb_s']} KB/s | "
+                  f"overhead médio: {fases['overhead']['media_s']:.4f}s")
+        
+        # Decomposição cliente x servidor (logs unidos por request_id)
+        try:
+            decomposicao = analisar_decomposicao(
+                logs, os.path.join(INPUT_ROOT, experiment_id), f"{output_dir}/decomposicao.json"
+            )
+            if decomposicao is not None:
+                print(f"✓ Componente dominante da latência: {decomposicao['dominante']}")
+        except (OSError, ValueError) as e:
+            print(f"⚠ Decomposição ignorada: {str(e)}")
+        
+        # Curva de saturação (somente experimentos com RAMP_MODE no cliente)
+        rampa = carregar_rampa(os.path.join(INPUT_ROOT, experiment_id))
+        if rampa is not None:
+            saturacao = analisar_saturacao(rampa, f"{output_dir}/saturacao.json")
+            if saturacao is not None:
+                joelho, maximo = saturacao['joelho'], saturacao['max_sustentavel']
+                if joelho is not None:
+                    print(f"✓ Joelho da vazão ({joelho['origem']}): N={joelho['N']:.1f}, "
+                          f"{joelho['vazao_rps']:.1f} req/s")
+                print(f"✓ Vazão máxima dentro do SLO: {maximo['throughput_rps'] if maximo else '-'} req/s")
+        
         # Gerar gráficos
         plot_resultados(X, y, resultados, f"{output_dir}/resultados.png")
         
+        # Validação cruzada k-fold (detecta sobreajuste)
+        cv = None
+        if cv_folds > 1:
+            try:
+                cv = validacao_cruzada(X, y, cv_folds, perda=perda)
+            except ValueError as e:
+                print(f"⚠ Validação cruzada ignorada: {str(e)}")
+        
         # Gerar e salvar relatório de validação
-        relatorio = validar_resultados(resultados)
+        relatorio = validar_resultados(resultados, cv)
         with open(f"{output_dir}/relatorio_validacao.json", 'w') as f:
             json.dump(relatorio, f, indent=4)
         
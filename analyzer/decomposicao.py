@@ -0,0 +1,120 @@
+# decomposicao.py
+import glob
+import json
+import os
+
+import numpy as np
+
+from ajuste import INPUT_ROOT, OUTPUT_ROOT, ajuste_tempo_por_kb
+
+COMPONENTES = ['fila_cliente', 'conexao', 'fila_rede', 'servidor', 'transferencia']
+
+
+def carregar_logs_servidor(diretorio):
+    """Log unido do servidor ou, se ainda não existir, a soma dos shards dos workers"""
+    caminhos = [os.path.join(diretorio, "server_logs.json")]
+    if not os.path.exists(caminhos[0]):
+        caminhos = sorted(glob.glob(os.path.join(diretorio, "server_logs.*.json")))
+
+    registros = []
+    for caminho in caminhos:
+        with open(caminho) as f:
+            registros.extend(json.load(f).get("requests", []))
+    return registros
+
+
+def juntar_logs(logs_cliente, logs_servidor):
+    """
+    Hash join cliente x servidor pelo request_id.
+
+    O lado do servidor (build) é indexado em um dicionário; o cliente (probe)
+    é percorrido uma vez. Registros sem par ou com falha são descartados.
+    """
+    indice = {
+        s['request_id']: s for s in logs_servidor
+        if s.get('request_id') and s.get('status') == 'success'
+    }
+    pares = []
+    for c in logs_cliente:
+        s = indice.get(c.get('request_id'))
+        if s is not None and c.get('status_code') == 200 and c.get('ttfb') is not None:
+            pares.append((c, s))
+    return pares
+
+
+def decompor_latencia(pares):
+    """
+    Decompõe a latência de cada requisição em componentes aditivos.
+
+    Metodologia:
+    1. fila_cliente: atraso entre o envio planejado e o efetivo (malha aberta)
+    2. conexao: handshake TCP medido pelo cliente
+    3. fila_rede: TTFB menos o processamento no servidor (fila de accept + rede),
+       sem depender de relógios sincronizados
+    4. servidor: response_time registrado em handle_file_request
+    5. transferencia: leitura do corpo pelo cliente
+
+    Retorna:
+    linhas - Lista de dicionários por requisição
+    """
+    linhas = []
+    for c, s in pares:
+        servidor = s.get('response_time', 0.0)
+        linhas.append({
+            'request_id': c['request_id'],
+            'kb': c['bytes_received'] / 1024,
+            'total': c['elapsed_time'],
+            'fila_cliente': max(0.0, c['send_time'] - c.get('intended_time', c['send_time'])),
+            'conexao': c['connect_time'],
+            'fila_rede': max(0.0, c['ttfb'] - servidor),
+            'servidor': servidor,
+            'transferencia': c['transfer_time']
+        })
+    return linhas
+
+
+def resumir_decomposicao(linhas, metodo='gauss'):
+    """Média, p99, participação e ajuste por KB de cada componente"""
+    kb = [l['kb'] for l in linhas]
+    total_medio = float(np.mean([l['total'] for l in linhas]))
+
+    resumo = {'pontos': len(linhas), 'latencia_media_s': total_medio, 'componentes': {}}
+    for nome in COMPONENTES:
+        valores = [l[nome] for l in linhas]
+        media = float(np.mean(valores))
+        resumo['componentes'][nome] = {
+            'media_s': media,
+            'p99_s': float(np.percentile(valores, 99)),
+            'participacao': media / total_medio if total_medio > 0 else 0.0,
+            'ajuste': ajuste_tempo_por_kb(kb, valores, metodo)
+        }
+    resumo['dominante'] = max(COMPONENTES, key=lambda n: resumo['componentes'][n]['media_s'])
+    return resumo
+
+
+def analisar_decomposicao(logs_cliente, diretorio_entrada, caminho_saida):
+    """Executa junção, decomposição e ajuste; retorna o resumo ou None sem dados"""
+    logs_servidor = carregar_logs_servidor(diretorio_entrada)
+    linhas = decompor_latencia(juntar_logs(logs_cliente, logs_servidor))
+    if len(linhas) < 4:
+        return None
+
+    resumo = resumir_decomposicao(linhas)
+    with open(caminho_saida, 'w') as f:
+        json.dump({'resumo': resumo, 'requisicoes': linhas}, f, indent=4)
+    return resumo
+
+
+if __name__ == "__main__":
+    experiment_id = os.getenv("EXPERIMENT_ID", "default")
+    entrada = os.path.join(INPUT_ROOT, experiment_id)
+    saida = os.path.join(OUTPUT_ROOT, experiment_id)
+    os.makedirs(saida, exist_ok=True)
+
+    with open(os.path.join(entrada, "requests_log.json")) as f:
+        logs = json.load(f)
+    resumo = analisar_decomposicao(logs, entrada, os.path.join(saida, "decomposicao.json"))
+    if resumo is None:
+        print("⚠ Nenhuma requisição com par no log do servidor")
+    else:
+        print(f"✅ Componente dominante: {resumo['dominante']} ({resumo['pontos']} requisições)")
@@ -0,0 +1,255 @@
+# live.py
+import json
+import math
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+
+from ajuste import INPUT_ROOT, OUTPUT_ROOT, regularizar, resolver_sistema
+from clustering import FEATURE_WINDOW, IndiceClusters, features_carga, normalizar_registro
+from modelo import FEATURES
+
+EXPERIMENT_ID = os.getenv("EXPERIMENT_ID", "default")
+RUN_ID = os.getenv("RUN_ID", "")  # Se definido, ignora registros de outras execuções no mesmo JSONL
+LOG_PATH = os.path.join(INPUT_ROOT, EXPERIMENT_ID, "requests_log.jsonl")
+OUTPUT_DIR = os.path.join(OUTPUT_ROOT, EXPERIMENT_ID)
+SNAPSHOT_FILE = os.path.join(OUTPUT_DIR, "live_snapshot.json")
+HISTORY_FILE = os.path.join(OUTPUT_DIR, "live_history.jsonl")
+SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", "5"))  # segundos
+IDLE_TIMEOUT = float(os.getenv("IDLE_TIMEOUT", "300"))  # segundos sem dados novos
+POLL_INTERVAL = 0.5
+LIVE_HORIZON = float(os.getenv("LIVE_HORIZON", "10"))  # segundos de atraso até as features de carga fecharem
+METODOS = ['gauss', 'jacobi', 'gauss_seidel']
+
+
+class AjusteIncremental:
+    """
+    Equações normais acumuladas registro a registro.
+
+    Metodologia:
+    1. Cada registro soma a^T a e a^T y ao sistema (custo O(k²) por registro)
+    2. A resolução usa a mesma regularização e os mesmos métodos do ajuste em lote
+    3. RMSE e R² saem das somas: SSE = Σy² - 2θ·A^T y + θ·(A^T A)θ
+    """
+
+    def __init__(self, k):
+        self.ATA = [[0.0]*k for _ in range(k)]
+        self.ATB = [0.0]*k
+        self.n = 0
+        self.soma_y = 0.0
+        self.soma_yy = 0.0
+
+    def adicionar(self, a, y):
+        k = len(a)
+        for i in range(k):
+            for j in range(k):
+                self.ATA[i][j] += a[i] * a[j]
+            self.ATB[i] += a[i] * y
+        self.n += 1
+        self.soma_y += y
+        self.soma_yy += y * y
+
+    def resolver(self, metodo):
+        return resolver_sistema(regularizar(self.ATA), self.ATB, metodo)
+
+    def metricas(self, theta):
+        k = len(theta)
+        quad = sum(theta[i] * self.ATA[i][j] * theta[j] for i in range(k) for j in range(k))
+        sse = max(0.0, self.soma_yy - 2 * sum(t * b for t, b in zip(theta, self.ATB)) + quad)
+        ss_total = self.soma_yy - self.soma_y ** 2 / self.n
+        return {
+            'rmse': math.sqrt(sse / self.n),
+            'r2': 1 - sse / ss_total if ss_total > 0 else 0
+        }
+
+
+def seguir_arquivo(caminho):
+    """
+    Acompanha um JSONL em crescimento (tail -f), devolvendo lotes de registros novos.
+
+    Linhas incompletas ficam no buffer até o escritor terminá-las. Retorna uma
+    lista vazia quando não há dados novos, para o chamador controlar o tempo.
+    Se o arquivo for truncado, a leitura recomeça do início.
+    """
+    while not os.path.exists(caminho):
+        yield []
+
+    with open(caminho, 'r') as f:
+        buffer = ""
+        while True:
+            bloco = f.read()
+            if not bloco:
+                if os.path.getsize(caminho) < f.tell():
+                    f.seek(0)  # Arquivo truncado: novo experimento
+                    buffer = ""
+                yield []
+                continue
+
+            buffer += bloco
+            *linhas, buffer = buffer.split("\n")
+            registros = []
+            for linha in linhas:
+                if linha.strip():
+                    try:
+                        registros.append(json.loads(linha))
+                    except ValueError:
+                        print(f"⚠ Linha inválida ignorada: {linha[:80]}", flush=True)
+            yield registros
+
+
+class FeaturesAtrasadas:
+    """
+    Features de carga do ajuste em lote calculadas sobre um fluxo de registros.
+    
+    O log chega em ordem de conclusão, então as features de um envio em t só
+    ficam completas quando nenhuma requisição anterior a t ainda pode chegar.
+    Um registro "amadurece" quando o relógio do log (maior envio visto) passa
+    de t + LIVE_HORIZON; requisições mais lentas que o horizonte são ignoradas
+    na contagem de carga. O contexto guardado cobre só horizonte + janela.
+    """
+    
+    def __init__(self, indice=None, horizonte=LIVE_HORIZON, janela=FEATURE_WINDOW):
+        self.indice = indice
+        self.horizonte = horizonte
+        self.janela = janela
+        self.contexto = []  # Registros que ainda influenciam features (ordenados por envio)
+        self.pendentes = []  # Registros cujas features ainda podem mudar
+        self.relogio = float('-inf')
+    
+    @staticmethod
+    def _inicio(log):
+        return log.get('intended_time', log.get('send_time'))
+    
+    def adicionar(self, registros, final=False):
+        """Recebe registros novos; retorna [(features + cluster, latência)] dos amadurecidos"""
+        for log in registros:
+            if self._inicio(log) is None:
+                continue
+            self.contexto.append(log)
+            self.pendentes.append(log)
+            self.relogio = max(self.relogio, self._inicio(log))
+        
+        limite = float('inf') if final else self.relogio - self.horizonte
+        prontos = [l for l in self.pendentes if self._inicio(l) <= limite]
+        if not prontos:
+            return []
+        self.pendentes = [l for l in self.pendentes if self._inicio(l) > limite]
+        
+        self.contexto.sort(key=self._inicio)
+        posicao = {id(l): i for i, l in enumerate(self.contexto)}
+        F = features_carga(self.contexto, self.janela)
+        
+        linhas = []
+        for log in prontos:
+            tamanho, latencia = normalizar_registro(log)
+            linhas.append(([tamanho, *F[posicao[id(log)]].tolist()], latencia))
+        if self.indice is not None:
+            rotulos = self.indice.atribuir([x for x, _ in linhas])[0]
+        else:
+            rotulos = [0] * len(linhas)
+        
+        # Descarta o que não influencia mais nenhuma feature futura
+        corte = limite - self.horizonte - self.janela
+        self.contexto = [l for l in self.contexto if self._inicio(l) >= corte]
+        return [(x + [int(c)], y) for (x, y), c in zip(linhas, rotulos)]
+
+def da_execucao(log):
+    """Registro (ou marcador) pertence à execução RUN_ID; sem RUN_ID aceita tudo"""
+    if not RUN_ID:
+        return True
+    if 'event' in log:
+        return log.get('run_id') == RUN_ID
+    return str(log.get('request_id', '')).startswith(f"{EXPERIMENT_ID}-{RUN_ID}-")
+
+def gerar_snapshot(ajuste, latencias, erros, concluido):
+    """Resolve o sistema acumulado e resume o estado atual do experimento"""
+    snapshot = {
+        'timestamp': datetime.now().isoformat(),
+        'registros': ajuste.n,
+        'erros': erros,
+        'concluido': concluido,
+        'features': FEATURES + ['cluster', 'bias'],
+        'metodos': {},
+        'latencia': {}
+    }
+    if ajuste.n < 4:
+        return snapshot
+
+    for metodo in METODOS:
+        theta = ajuste.resolver(metodo)
+        snapshot['metodos'][metodo] = {'theta': theta, **ajuste.metricas(theta)}
+
+    valores = np.asarray(latencias)
+    snapshot['latencia'] = {
+        'media': float(valores.mean()),
+        'p50': float(np.percentile(valores, 50)),
+        'p99': float(np.percentile(valores, 99))
+    }
+    return snapshot
+
+
+def salvar_snapshot(snapshot):
+    with open(SNAPSHOT_FILE + ".tmp", 'w') as f:
+        json.dump(snapshot, f, indent=4)
+    os.replace(SNAPSHOT_FILE + ".tmp", SNAPSHOT_FILE)  # Leitores nunca veem arquivo parcial
+    with open(HISTORY_FILE, 'a') as f:
+        f.write(json.dumps(snapshot) + "\n")
+
+
+def main():
+    """Ajusta o mesmo modelo do lote (features de carga + cluster + bias) enquanto o cliente escreve o log"""
+    print(f"=== ANALYZER LIVE ({LOG_PATH}) ===", flush=True)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    if os.path.exists(HISTORY_FILE):
+        os.remove(HISTORY_FILE)
+
+    indice = IndiceClusters.carregar()
+    features = FeaturesAtrasadas(indice)
+    ajuste = AjusteIncremental(len(FEATURES) + 2)
+    latencias = []
+    erros = 0
+    concluido = False
+    inicio = ultimo_dado = proximo_snapshot = time.time()
+
+    for registros in seguir_arquivo(LOG_PATH):
+        agora = time.time()
+        novos = []
+        for log in registros:
+            if not da_execucao(log):
+                continue
+            if log.get('event') == 'done':
+                concluido = True
+                continue
+            if log.get('error') or log.get('status_code') != 200:
+                erros += 1  # Entram no ajuste, como em preprocess_logs
+            novos.append(log)
+        
+        for x, latencia in features.adicionar(novos, final=concluido):
+            ajuste.adicionar(x + [1], latencia)
+            latencias.append(latencia)
+
+        if registros:
+            ultimo_dado = agora
+        ocioso = agora - ultimo_dado > IDLE_TIMEOUT
+
+        if concluido or ocioso or agora >= proximo_snapshot:
+            snapshot = gerar_snapshot(ajuste, latencias, erros, concluido)
+            salvar_snapshot(snapshot)
+            proximo_snapshot = agora + SNAPSHOT_INTERVAL
+
+            theta = snapshot['metodos'].get('gauss', {}).get('theta')
+            print(f"[{agora - inicio:.0f}s] {ajuste.n} registros | θ (gauss) = {theta}", flush=True)
+
+        if concluido:
+            print(f"✅ Experimento concluído. Snapshot final em {SNAPSHOT_FILE}", flush=True)
+            return
+        if ocioso:
+            raise TimeoutError(f"Sem dados novos há {IDLE_TIMEOUT}s")
+        if not registros:
+            time.sleep(POLL_INTERVAL)
+
+
+if __name__ == "__main__":
+    main()
@@ -56,7 +56,7 @@ def vetor_norma(v):
 def produto_escalar(v1, v2):
     return sum(x*y for x,y in zip(v1, v2))
 
-def jacobi(A, b, max_iter=10000, tol=1e-10, damping=0.8):
+def jacobi(A, b, max_iter=10000, tol=1e-10, damping=0.8, x0=None):
     """
     Implementa o método de Jacobi com pré-condicionamento e fator de amortecimento.
     
@@ -71,9 +71,10 @@ def jacobi(A, b, max_iter=10000, tol=1e-10, damping=0.8):
     max_iter - Número máximo de iterações
     tol - Tolerância para convergência
     damping - Fator de amortecimento (0.8 = 80% novo valor, 20% anterior)
+    x0 - Estimativa inicial (warm start); zeros se omitida
     """
     n = len(A)
-    x = [0.0 for _ in range(n)]
+    x = [float(v) for v in x0] if x0 is not None else [0.0 for _ in range(n)]
     
     # Pré-condicionamento adaptativo
     diag = [A[i][i] if A[i][i] != 0 else 1e-10 for i in range(n)]
@@ -104,7 +105,7 @@ def jacobi(A, b, max_iter=10000, tol=1e-10, damping=0.8):
             
     return x
 
-def gauss_seidel(A, B, max_iter=5000, tol=1e-12):
+def gauss_seidel(A, B, max_iter=5000, tol=1e-12, x0=None):
     """
     Implementa o método de Gauss-Seidel com atualização in-place e verificação de convergência.
     
@@ -118,9 +119,10 @@ def gauss_seidel(A, B, max_iter=5000, tol=1e-12):
     B - Vetor de termos independentes
     max_iter - Número máximo de iterações
     tol - Tolerância absoluta para convergência
+    x0 - Estimativa inicial (warm start); uns se omitida
     """
     n = len(B)
-    x = [1.0] * n  # Inicialização conservadora
+    x = [float(v) for v in x0] if x0 is not None else [1.0] * n  # Inicialização conservadora
     
     for _ in range(max_iter):
         x_antigo = x.copy()
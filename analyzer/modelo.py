@@ -0,0 +1,201 @@
+# modelo.py
+import json
+import os
+import sys
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+VERSAO_MODELO = 1
+FEATURES = ['tamanho_kb', 'em_voo', 'req_s', 'kb_s']  # Ordem das colunas antes do cluster e do bias
+FEATURES_CLUSTER = ['tamanho_kb']  # Só o que não depende da carga: ids estáveis entre experimentos
+CHUNK = 262144  # Linhas por bloco na atribuição de clusters
+MODEL_PATH = os.getenv("MODEL_PATH", "/app/output/default/modelo.json")
+PREDICT_PORT = int(os.getenv("PREDICT_PORT", "8000"))
+
+
+def prever_linear(theta, X):
+    """Predição vetorizada: X (n x k) com a coluna de cluster; theta termina no bias"""
+    X = np.asarray(X, dtype=float)
+    theta = np.asarray(theta, dtype=float)
+    return X @ theta[:-1] + theta[-1]
+
+
+def colunas_cluster(X, features=FEATURES, features_cluster=FEATURES_CLUSTER):
+    """Colunas de X (na ordem de features) que entram na distância aos centroides"""
+    X = np.asarray(X, dtype=float)
+    return X[:, [features.index(f) for f in features_cluster]]
+
+
+def centroide_mais_proximo(X, media, escala, centroides):
+    """
+    Centroide mais próximo no espaço padronizado, processado em blocos de CHUNK linhas.
+
+    Retorna:
+    rotulos - Índice do centroide de cada linha
+    dist2 - Distância quadrática até esse centroide (inércia por ponto)
+    """
+    X = np.asarray(X, dtype=float)
+    rotulos = np.zeros(len(X), dtype=np.int64)
+    dist2 = np.zeros(len(X))
+    norma_c = (centroides ** 2).sum(axis=1)
+    for inicio in range(0, len(X), CHUNK):
+        bloco = (X[inicio:inicio + CHUNK] - media) / escala
+        # ||x - c||² = ||x||² + ||c||² - 2 x·c; o argmin dispensa ||x||²
+        parcial = norma_c - 2 * bloco @ centroides.T
+        r = parcial.argmin(axis=1)
+        rotulos[inicio:inicio + CHUNK] = r
+        dist2[inicio:inicio + CHUNK] = np.maximum(
+            parcial[np.arange(len(r)), r] + (bloco ** 2).sum(axis=1), 0.0
+        )
+    return rotulos, dist2
+
+
+def salvar_modelo(caminho, theta, metodo, modelo_clusters, experimento, metricas=None):
+    """
+    Grava o artefato versionado do modelo ajustado.
+
+    Parâmetros:
+    caminho - Arquivo JSON de destino
+    theta - Parâmetros [features..., cluster, bias]
+    metodo - Método numérico que gerou theta
+    modelo_clusters - IndiceClusters usado em preprocess_logs, ou None
+    experimento - Identificador do experimento de origem
+    metricas - MAE/RMSE/R² do ajuste (opcional)
+    """
+    artefato = {
+        'versao': VERSAO_MODELO,
+        'criado_em': datetime.now().isoformat(),
+        'experimento': experimento,
+        'metodo': metodo,
+        'features': FEATURES,
+        'theta': [float(t) for t in theta],
+        'features_cluster': FEATURES_CLUSTER,
+        'scaler': None,
+        'centroides': None,
+        'indice_clusters': None,
+        'metricas': metricas or {}
+    }
+    if modelo_clusters is not None:
+        artefato['scaler'] = {
+            'media': modelo_clusters.media.tolist(),
+            'escala': modelo_clusters.escala.tolist()
+        }
+        artefato['centroides'] = modelo_clusters.centroides.tolist()
+        artefato['indice_clusters'] = modelo_clusters.versao_id  # indice_clusters.<versão>.json que gerou os ids
+
+    with open(caminho, 'w') as f:
+        json.dump(artefato, f, indent=4)
+    print(f"✓ Modelo ({metodo}) salvo em {caminho}")
+    return artefato
+
+
+class ModeloLatencia:
+    """Modelo carregado uma vez e aplicado em lote a arrays de features"""
+
+    def __init__(self, artefato):
+        if artefato.get('versao') != VERSAO_MODELO:
+            raise ValueError(f"Versão de modelo não suportada: {artefato.get('versao')}")
+        self.artefato = artefato
+        self.features = artefato['features']
+        self.theta = np.asarray(artefato['theta'], dtype=float)
+        self.centroides = None
+        if artefato['centroides'] is not None:
+            self.media = np.asarray(artefato['scaler']['media'])
+            self.escala = np.asarray(artefato['scaler']['escala'])
+            self.centroides = np.asarray(artefato['centroides'])
+            # Artefatos anteriores agrupavam por todas as features
+            self.features_cluster = artefato.get('features_cluster', self.features)
+
+    @classmethod
+    def carregar(cls, caminho=MODEL_PATH):
+        with open(caminho) as f:
+            return cls(json.load(f))
+
+    def clusters(self, X):
+        """Centroide mais próximo (espaço padronizado), processado em blocos"""
+        if self.centroides is None:
+            return np.zeros(len(X), dtype=np.int64)
+        X = colunas_cluster(X, self.features, self.features_cluster)
+        return centroide_mais_proximo(X, self.media, self.escala, self.centroides)[0]
+
+    def prever(self, X):
+        """
+        Latência prevista (s) para cada linha de X.
+
+        Parâmetros:
+        X - Array (n x len(features)) na ordem de self.features
+
+        Retorna:
+        y - Array (n) de latências previstas
+        """
+        X = np.asarray(X, dtype=float).reshape(-1, len(self.features))
+        rotulos = self.clusters(X)
+        return X @ self.theta[:len(self.features)] + self.theta[-2] * rotulos + self.theta[-1]
+
+    def prever_colunas(self, colunas):
+        """Predição a partir de {feature: lista de valores}"""
+        faltando = [f for f in self.features if f not in colunas]
+        if faltando:
+            raise ValueError(f"Features ausentes: {faltando}")
+        return self.prever(np.column_stack([np.asarray(colunas[f], dtype=float) for f in self.features]))
+
+
+def criar_servidor(modelo, host="0.0.0.0", port=PREDICT_PORT):
+    """Servidor HTTP local de predição (GET/POST /predict, GET /health)"""
+
+    class PredicaoHandler(BaseHTTPRequestHandler):
+        def _responder(self, status, corpo):
+            dados = json.dumps(corpo).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def _prever(self, colunas):
+            try:
+                latencia = modelo.prever_colunas(colunas)
+                self._responder(200, {'latencia': latencia.tolist()})
+            except (ValueError, TypeError) as e:
+                self._responder(400, {'erro': str(e)})
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path == '/health':
+                self._responder(200, {
+                    'status': 'healthy',
+                    'metodo': modelo.artefato['metodo'],
+                    'experimento': modelo.artefato['experimento']
+                })
+            elif url.path == '/predict':
+                self._prever({k: v for k, v in parse_qs(url.query).items()})
+            else:
+                self._responder(404, {'erro': 'Rota inexistente'})
+
+        def do_POST(self):
+            if urlsplit(self.path).path != '/predict':
+                self._responder(404, {'erro': 'Rota inexistente'})
+                return
+            try:
+                tamanho = int(self.headers.get('Content-Length', 0))
+                colunas = json.loads(self.rfile.read(tamanho))
+            except ValueError as e:
+                self._responder(400, {'erro': f"JSON inválido: {str(e)}"})
+                return
+            self._prever(colunas)
+
+    return ThreadingHTTPServer((host, port), PredicaoHandler)
+
+
+if __name__ == "__main__":
+    caminho = sys.argv[1] if len(sys.argv) > 1 else MODEL_PATH
+    modelo = ModeloLatencia.carregar(caminho)
+    servidor = criar_servidor(modelo)
+    print(f"=== PREDIÇÃO ({caminho}) em :{PREDICT_PORT} ===", flush=True)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        servidor.server_close()
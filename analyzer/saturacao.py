@@ -0,0 +1,173 @@
+# saturacao.py
+import json
+import math
+import os
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+from ajuste import INPUT_ROOT, OUTPUT_ROOT, calcular_metricas_erro, sistema_normal
+from metodos_numericos import gauss_pivoteamento
+
+
+def carregar_rampa(diretorio):
+    """Resumo da rampa gravado pelo cliente (RAMP_MODE), ou None"""
+    caminho = os.path.join(diretorio, "ramp_summary.json")
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho) as f:
+        return json.load(f)
+
+
+def ajuste_usl(N, X):
+    """
+    Ajusta a Lei Universal de Escalabilidade X(N) = λN / (1 + σ(N-1) + κN(N-1)).
+
+    Metodologia:
+    1. Linearização: N/X = 1/λ + (σ/λ)(N-1) + (κ/λ)N(N-1)
+    2. Colunas escaladas por N máximo para condicionar as equações normais 3x3
+    3. Resolução por eliminação de Gauss com pivoteamento (sem regularização,
+       que distorceria 1/λ com tão poucos pontos)
+
+    Parâmetros:
+    N - Concorrência média de cada degrau (lei de Little)
+    X - Vazão de cada degrau (req/s)
+
+    Retorna:
+    usl - Dicionário com λ, σ, κ e métricas do ajuste, ou None sem ajuste válido
+          (exige mais degraus que parâmetros: com 3 pontos o ajuste é exato,
+          R² = 1 sempre, e o joelho vira extrapolação)
+    """
+    N = np.asarray(N, dtype=float)
+    X = np.asarray(X, dtype=float)
+    validos = (N > 0) & (X > 0)
+    N, X = N[validos], X[validos]
+    if len(N) <= 3:
+        return None
+
+    escala = N.max()
+    A = [[1.0, (n - 1) / escala, n * (n - 1) / escala ** 2] for n in N]
+    ATA, ATB = sistema_normal(A, N / X)
+    try:
+        a, b, c = gauss_pivoteamento(ATA, ATB)
+    except Exception as e:
+        print(f"⚠ Ajuste USL falhou: {str(e)}")
+        return None
+    b, c = b / escala, c / escala ** 2
+    if a <= 0:
+        return None
+
+    usl = {'lambda': float(1 / a), 'sigma': float(b / a), 'kappa': float(c / a)}
+    usl.update(calcular_metricas_erro(X.tolist(), prever_usl(usl, N).tolist()))
+    return usl
+
+
+def prever_usl(usl, N):
+    N = np.asarray(N, dtype=float)
+    return usl['lambda'] * N / (1 + usl['sigma'] * (N - 1) + usl['kappa'] * N * (N - 1))
+
+
+def joelho_usl(usl):
+    """N* = sqrt((1-σ)/κ): concorrência de vazão máxima (None sem retrocesso)"""
+    if usl is None or usl['kappa'] <= 0 or usl['sigma'] >= 1:
+        return None
+    n = math.sqrt((1 - usl['sigma']) / usl['kappa'])
+    x = float(prever_usl(usl, n))
+    return {'N': n, 'vazao_rps': x, 'latencia_s': n / x, 'origem': 'usl'}
+
+
+def joelho_kneedle(N, X):
+    """
+    Joelho pela maior distância à diagonal (Kneedle) na curva normalizada.
+
+    Usado quando a USL não tem ponto de máximo (κ <= 0 ou σ >= 1), não ajusta
+    ou tem degraus de menos.
+    """
+    ordem = np.argsort(N)
+    N = np.asarray(N, dtype=float)[ordem]
+    X = np.asarray(X, dtype=float)[ordem]
+    if len(N) < 3 or N[-1] == N[0] or X.max() == X.min():
+        return None
+
+    n_norm = (N - N[0]) / (N[-1] - N[0])
+    x_norm = (X - X.min()) / (X.max() - X.min())
+    i = int(np.argmax(x_norm - n_norm))
+    return {'N': float(N[i]), 'vazao_rps': float(X[i]), 'latencia_s': float(N[i] / X[i]), 'origem': 'kneedle'}
+
+
+def analisar_saturacao(rampa, caminho_saida):
+    """
+    Ajusta a curva vazão x concorrência dos degraus da rampa.
+
+    Parâmetros:
+    rampa - Conteúdo de ramp_summary.json
+    caminho_saida - JSON de destino (o gráfico vai ao lado, em .png)
+
+    Retorna:
+    resultado - Dicionário com USL, joelho e vazão máxima sustentada, ou None sem degraus
+    """
+    degraus = [d for d in rampa['steps'] if d['throughput_rps'] > 0 and d['in_flight'] > 0]
+    if not degraus:
+        return None
+
+    N = [d['in_flight'] for d in degraus]  # Lei de Little: N = X·R
+    X = [d['throughput_rps'] for d in degraus]
+    usl = ajuste_usl(N, X)
+    joelho = joelho_usl(usl) or joelho_kneedle(N, X)
+    if joelho is not None:
+        joelho['extrapolado'] = joelho['N'] > max(N)  # Além do maior degrau medido
+
+    resultado = {
+        'modo': rampa['ramp_mode'],
+        'slo_p99': rampa['slo_p99'],
+        'parada': rampa['stop_reason'],
+        'pontos': len(degraus),
+        'usl': usl,
+        'joelho': joelho,
+        'max_sustentavel': rampa['max_sustainable'],
+        'degraus': [
+            {'N': n, 'vazao_rps': x, 'p50': d['p50'], 'p99': d['p99'], 'dentro_slo': d['within_slo']}
+            for n, x, d in zip(N, X, degraus)
+        ]
+    }
+    with open(caminho_saida, 'w') as f:
+        json.dump(resultado, f, indent=4)
+
+    plot_saturacao(N, X, usl, joelho, os.path.splitext(caminho_saida)[0] + ".png")
+    return resultado
+
+
+def plot_saturacao(N, X, usl, joelho, caminho_saida):
+    plt.figure(figsize=(10, 6))
+    plt.scatter(N, X, color='tab:blue', label='Degraus da rampa')
+    if usl is not None:
+        grade = np.linspace(min(N), max(max(N), joelho['N'] if joelho else 0) * 1.1, 200)
+        plt.plot(grade, prever_usl(usl, grade), color='tab:orange',
+                 label=f"USL (σ={usl['sigma']:.3f}, κ={usl['kappa']:.2e})")
+    if joelho is not None:
+        plt.axvline(joelho['N'], color='gray', linestyle='--',
+                    label=f"Joelho ({joelho['origem']}): N={joelho['N']:.1f}")
+    plt.xlabel('Concorrência média N (X·R)')
+    plt.ylabel('Vazão (req/s)')
+    plt.title('Curva de Saturação')
+    plt.legend()
+    plt.grid(True)
+    plt.savefig(caminho_saida, bbox_inches='tight')
+    plt.close()
+
+
+if __name__ == "__main__":
+    experiment_id = os.getenv("EXPERIMENT_ID", "default")
+    entrada = os.path.join(INPUT_ROOT, experiment_id)
+    saida = os.path.join(OUTPUT_ROOT, experiment_id)
+    os.makedirs(saida, exist_ok=True)
+
+    rampa = carregar_rampa(entrada)
+    resultado = analisar_saturacao(rampa, os.path.join(saida, "saturacao.json")) if rampa else None
+    if resultado is None:
+        print("⚠ Nenhuma rampa com degraus válidos (RAMP_MODE desativado?)")
+    else:
+        joelho, maximo = resultado['joelho'], resultado['max_sustentavel']
+        if joelho is not None:
+            print(f"✓ Joelho ({joelho['origem']}): N={joelho['N']:.1f}, {joelho['vazao_rps']:.1f} req/s")
+        print(f"✅ Vazão máxima dentro do SLO: {maximo['throughput_rps'] if maximo else '-'} req/s")
@@ -1,127 +1,629 @@
 import os
 import time
-import random
-import requests
+import http.client
 import json
+import numpy as np
+import glob
+import heapq
+import multiprocessing
+import uuid
 from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
 
 # Configurações via variáveis de ambiente com validação
 try:
     TOTAL_REQUESTS = int(os.getenv("TOTAL_REQS", "500"))
     CONCURRENT_CLIENTS = int(os.getenv("CONCURRENT_CLIENTS", "50"))
     EXPERIMENT_ID = os.getenv("EXPERIMENT_ID", "default")
+    LOAD_MODE = os.getenv("LOAD_MODE", "closed")  # closed | open
+    TARGET_RPS = float(os.getenv("TARGET_RPS", "50"))  # Taxa ofertada no modo open
+    ARRIVAL = os.getenv("ARRIVAL", "poisson")  # poisson | constant
+    CLIENT_PROCESSES = int(os.getenv("CLIENT_PROCESSES", "1"))  # >1 = modo coordenador
+    TRACE_MODE = os.getenv("TRACE_MODE", "")  # "" | record | replay
+    TRACE_SEED = int(os.getenv("TRACE_SEED")) if os.getenv("TRACE_SEED") else None
+    REPLAY_SPEED = float(os.getenv("REPLAY_SPEED", "1"))  # 2 = 2x mais rápido, 0 = sem agenda
+    RAMP_MODE = os.getenv("RAMP_MODE", "")  # "" | concurrency | rate
+    RAMP_START = float(os.getenv("RAMP_START", "10"))  # Clientes ou req/s no primeiro degrau
+    RAMP_STEP = float(os.getenv("RAMP_STEP", "10"))  # Incremento por degrau
+    RAMP_MAX_STEPS = int(os.getenv("RAMP_MAX_STEPS", "20"))
+    RAMP_WINDOW = int(os.getenv("RAMP_WINDOW", "200"))  # Requisições por janela de medição
+    RAMP_MAX_WINDOWS = int(os.getenv("RAMP_MAX_WINDOWS", "5"))  # Janelas por degrau sem estabilizar
+    RAMP_TOLERANCE = float(os.getenv("RAMP_TOLERANCE", "0.1"))  # Variação relativa de p50/p99 entre janelas
+    RAMP_MIN_GAIN = float(os.getenv("RAMP_MIN_GAIN", "0.05"))  # Ganho mínimo de vazão por degrau
+    RAMP_PATIENCE = int(os.getenv("RAMP_PATIENCE", "2"))  # Degraus seguidos sem ganho antes de parar
+    SLO_P99 = float(os.getenv("SLO_P99", "1.0"))  # segundos
+    SLO_ERROR_RATE = float(os.getenv("SLO_ERROR_RATE", "0.01"))
+    if LOAD_MODE not in ("closed", "open") or ARRIVAL not in ("poisson", "constant"):
+        raise ValueError(f"LOAD_MODE={LOAD_MODE} / ARRIVAL={ARRIVAL}")
+    if TRACE_MODE not in ("", "record", "replay") or REPLAY_SPEED < 0:
+        raise ValueError(f"TRACE_MODE={TRACE_MODE} / REPLAY_SPEED={REPLAY_SPEED}")
+    if TARGET_RPS <= 0:
+        raise ValueError(f"TARGET_RPS deve ser positivo ({TARGET_RPS})")
+    if not 1 <= CLIENT_PROCESSES <= min(TOTAL_REQUESTS, CONCURRENT_CLIENTS):
+        raise ValueError(f"CLIENT_PROCESSES fora do intervalo ({CLIENT_PROCESSES})")
+    if RAMP_MODE not in ("", "concurrency", "rate"):
+        raise ValueError(f"RAMP_MODE={RAMP_MODE}")
+    if RAMP_MODE and (CLIENT_PROCESSES > 1 or TRACE_MODE):
+        raise ValueError("RAMP_MODE não combina com CLIENT_PROCESSES > 1 nem com TRACE_MODE")
+    if min(RAMP_START, RAMP_STEP, RAMP_WINDOW, RAMP_MAX_WINDOWS, SLO_P99) <= 0:
+        raise ValueError("Parâmetros de rampa e SLO devem ser positivos")
 except ValueError as e:
     print(f"ERRO: Variável de ambiente inválida - {str(e)}")
     exit(1)
 
-URL = "http://server:5000/file"
-LOG_DIR = f"/app/output/{EXPERIMENT_ID}"
+URL = os.getenv("SERVER_URL", "http://server:5000/file")
+RUN_ID = os.getenv("RUN_ID") or uuid.uuid4().hex[:8]  # Nonce da execução: workers herdam o valor no fork
+REQUEST_TIMEOUT = 3  # segundos
+LOG_DIR = os.path.join(os.getenv("OUTPUT_ROOT", "/app/output"), EXPERIMENT_ID)
 LOG_FILE = f"{LOG_DIR}/requests_log.json"
+SUMMARY_FILE = f"{LOG_DIR}/latency_summary.json"
+STREAM_FILE = f"{LOG_DIR}/requests_log.jsonl"  # Uma linha por resposta, para o modo live
+TRACE_FILE = os.getenv("TRACE_FILE", f"{LOG_DIR}/workload_trace.npy")
+RAMP_FILE = f"{LOG_DIR}/ramp_summary.json"
 
-def generate_file_size():
-    """Gera tamanhos de arquivo com distribuição multimodal"""
-    try:
-        # Distribuições ajustadas para maior variabilidade
-        modes = [
-            {'type': 'normal', 'mean': 300, 'std': 100, 'prob': 0.5},
-            {'type': 'uniform', 'min': 10, 'max': 2000, 'prob': 0.3},
-            {'type': 'exponential', 'scale': 1000, 'prob': 0.2}
-        ]
-        
-        choice = random.choices(
-            modes, 
-            weights=[m['prob'] for m in modes]
-        )[0]
-        
-        if choice['type'] == 'normal':
-            return abs(round(random.gauss(choice['mean'], choice['std']), 2))
-        elif choice['type'] == 'uniform':
-            return round(random.uniform(choice['min'], choice['max']), 2)
-        else:
-            return round(random.expovariate(1/choice['scale']), 2)
-            
-    except Exception as e:
-        print(f"ERRO na geração de tamanho: {str(e)}")
-        return round(random.uniform(10, 1000), 2)
+class LatencyHistogram:
+    """Histograma log-linear no estilo HDR (resolução em µs, erro relativo < 0.1%)"""
+    SUB_BITS = 11  # 2048 sub-buckets por oitava
+
+    def __init__(self):
+        self.counts = {}
+        self.total = 0
+        self.sum_us = 0
+        self.max_us = 0
+
+    @classmethod
+    def _index(cls, value_us):
+        shift = value_us.bit_length() - cls.SUB_BITS
+        if shift <= 0:
+            return value_us
+        return (shift << (cls.SUB_BITS - 1)) + (value_us >> shift)
+
+    @classmethod
+    def _value(cls, index):
+        """Maior valor equivalente ao bucket (arredonda para cima, como o HDR)"""
+        if index < (1 << cls.SUB_BITS):
+            return index
+        shift = (index >> (cls.SUB_BITS - 1)) - 1
+        mantissa = index - (shift << (cls.SUB_BITS - 1))
+        return ((mantissa + 1) << shift) - 1
+
+    def record(self, seconds):
+        value_us = max(0, int(round(seconds * 1e6)))
+        index = self._index(value_us)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.total += 1
+        self.sum_us += value_us
+        self.max_us = max(self.max_us, value_us)
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+        self.sum_us += other.sum_us
+        self.max_us = max(self.max_us, other.max_us)
+
+    def percentile(self, p):
+        """Valor (s) no percentil p (0-100)"""
+        if self.total == 0:
+            return 0.0
+        target = max(1, int(round(p / 100 * self.total)))
+        acumulado = 0
+        for index in sorted(self.counts):
+            acumulado += self.counts[index]
+            if acumulado >= target:
+                return min(self._value(index), self.max_us) / 1e6
+        return self.max_us / 1e6
+
+    def summary(self):
+        return {
+            "count": self.total,
+            "mean": self.sum_us / self.total / 1e6 if self.total else 0.0,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "p999": self.percentile(99.9),
+            "max": self.max_us / 1e6,
+            "buckets": [[self._value(i), self.counts[i]] for i in sorted(self.counts)]
+        }
+
+SIZE_MODES = [
+    {'type': 'normal', 'mean': 300, 'std': 100, 'prob': 0.5},
+    {'type': 'uniform', 'min': 10, 'max': 2000, 'prob': 0.3},
+    {'type': 'exponential', 'scale': 1000, 'prob': 0.2}
+]
+
+TRACE_DTYPE = np.dtype([('size', '<f4'), ('offset', '<f8')])
+
+def generate_file_sizes(n, rng):
+    """Gera n tamanhos de arquivo (KB) com distribuição multimodal vetorizada"""
+    # Distribuições ajustadas para maior variabilidade
+    normal, uniform, exponential = SIZE_MODES
+    choice = rng.choice(len(SIZE_MODES), size=n, p=[m['prob'] for m in SIZE_MODES])
+    
+    sizes = np.empty(n)
+    mask = choice == 0
+    sizes[mask] = np.abs(rng.normal(normal['mean'], normal['std'], mask.sum()))
+    mask = choice == 1
+    sizes[mask] = rng.uniform(uniform['min'], uniform['max'], mask.sum())
+    mask = choice == 2
+    sizes[mask] = rng.exponential(exponential['scale'], mask.sum())
+    
+    return np.maximum(0.1, np.round(sizes, 2))  # Garante tamanho mínimo de 0.1 KB
+
+def generate_schedule(n, rate, rng, arrival=ARRIVAL):
+    """Offsets (s) de envio planejado para uma taxa-alvo em malha aberta"""
+    if arrival == 'constant':
+        return np.arange(n) / rate
+    gaps = rng.exponential(1 / rate, n)  # Chegadas de Poisson
+    gaps[0] = 0.0
+    return np.cumsum(gaps)
+
+def generate_trace(n, seed=None):
+    """Gera a carga (tamanho, offset de envio) de um experimento inteiro"""
+    rng = np.random.default_rng(seed)
+    trace = np.zeros(n, dtype=TRACE_DTYPE)
+    trace['size'] = generate_file_sizes(n, rng)
+    if LOAD_MODE == "open":
+        trace['offset'] = generate_schedule(n, TARGET_RPS, rng)
+    return trace  # Offsets nulos = malha fechada
 
-def simulate_request(client_id):
-    """Executa uma requisição com tratamento robusto de erros"""
+def save_trace(trace, path=TRACE_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.save(path, trace)
+    print(f"✓ Trace gravado em {path} ({trace.nbytes} bytes)")
+
+def load_trace(path=TRACE_FILE):
+    trace = np.load(path)
+    if trace.dtype != TRACE_DTYPE:
+        raise ValueError(f"Trace com formato inesperado: {trace.dtype}")
+    return trace
+
+def replay_speed(trace):
+    """Fator de velocidade da agenda; 0 = malha fechada (o mais rápido possível)"""
+    if TRACE_MODE == "replay":
+        return REPLAY_SPEED if len(trace) and trace['offset'][-1] > 0 else 0.0
+    return 1.0 if LOAD_MODE == "open" else 0.0
+
+_stream_fd = None
+
+def open_stream(truncate=False):
+    """Abre o log JSONL em modo append (compartilhado entre threads e processos)"""
+    global _stream_fd
+    os.makedirs(LOG_DIR, exist_ok=True)
+    flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND | (os.O_TRUNC if truncate else 0)
+    _stream_fd = os.open(STREAM_FILE, flags, 0o644)
+
+def stream_log(record):
+    """Acrescenta um registro ao JSONL com uma única escrita (linhas nunca se misturam)"""
+    if _stream_fd is not None:
+        os.write(_stream_fd, (json.dumps(record, ensure_ascii=False) + "\n").encode())
+
+def simulate_request(client_id, size, intended_time=None):
+    """Executa uma requisição com tratamento robusto de erros.
+    
+    Registra as fases da requisição (conexão, tempo até o primeiro byte e
+    transferência do corpo) e os bytes efetivamente recebidos. Com
+    intended_time (malha aberta) a latência é medida a partir do envio
+    planejado, corrigindo a omissão coordenada quando o cliente atrasa.
+    """
+    # Chave de junção com o log do servidor, única entre execuções do mesmo experimento
+    request_id = f"{EXPERIMENT_ID}-{RUN_ID}-{client_id}"
+    target = urlsplit(URL)
+    conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=REQUEST_TIMEOUT)
+    start_time = time.time()
     try:
-        size = max(0.1, generate_file_size())  # Garante tamanho mínimo de 0.1 KB
-        start_time = time.time()
-        
-        response = requests.get(f"{URL}/{int(size)}", timeout=3)
-        elapsed = max(0.001, round(time.time() - start_time, 4))  # Tempo mínimo de 0.001s
+        t0 = time.perf_counter()
+        conn.connect()
+        t_connect = time.perf_counter()
+        conn.request("GET", f"{target.path}/{int(size)}", headers={"X-Request-ID": request_id})
+        response = conn.getresponse()  # Retorna ao receber status e cabeçalhos
+        t_first_byte = time.perf_counter()
+        body = response.read()
+        t_end = time.perf_counter()
+        end_time = time.time()
+        elapsed = max(0.001, round(end_time - (intended_time or start_time), 4))  # Tempo mínimo de 0.001s
         
-        return {
+        result = {
             "client_id": client_id,
             "file_size": size,
-            "status_code": response.status_code,
+            "status_code": response.status,
             "elapsed_time": elapsed,
+            "connect_time": round(t_connect - t0, 6),
+            "ttfb": round(t_first_byte - t_connect, 6),
+            "transfer_time": round(t_end - t_first_byte, 6),
+            "bytes_received": len(body),
             "error": None
         }
+        if intended_time is not None:
+            result["service_time"] = round(end_time - start_time, 4)
     except Exception as e:
-        return {
+        result = {
             "client_id": client_id,
             "file_size": 0.1,  # Valor padrão seguro
             "status_code": 500,
             "elapsed_time": 0.001,  # Valor padrão seguro
             "error": str(e)
         }
+    finally:
+        conn.close()
+    
+    result["request_id"] = request_id
+    result["send_time"] = start_time
+    if intended_time is not None:
+        result["intended_time"] = intended_time
+    stream_log(result)
+    return result
+
+def collect_results(futures, ids, timeout=5):
+    """Coleta os resultados na ordem de submissão"""
+    logs = []
+    for i, future in enumerate(futures):
+        try:
+            result = future.result(timeout=timeout)
+            logs.append(result)
+            
+            if (i+1) % 50 == 0:
+                print(f"▶ Progresso: {i+1}/{len(ids)}")
+                
+        except Exception as e:
+            print(f"⚠ ERRO na requisição {i+1}: {str(e)}")
+            logs.append({
+                "client_id": int(ids[i]),
+                "error": str(e)
+            })
+    return logs
+
+def run_closed_loop(ids, trace, concurrency):
+    """Malha fechada: pool fixo, cada cliente só envia após a resposta anterior"""
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [
+            executor.submit(simulate_request, int(i), round(float(size), 2))
+            for i, size in zip(ids, trace['size'])
+        ]
+        return collect_results(futures, ids)
+
+def run_open_loop(ids, trace, concurrency, speed=1.0):
+    """Malha aberta: envios seguem a agenda, independentemente das respostas"""
+    offsets = trace['offset'] / speed
+    
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = []
+        start = time.time()
+        for i, size, offset in zip(ids, trace['size'], offsets):
+            intended = start + float(offset)
+            delay = intended - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            # A fila do executor absorve o atraso: a agenda nunca espera o servidor
+            futures.append(executor.submit(
+                simulate_request, int(i), round(float(size), 2), intended
+            ))
+        
+        return collect_results(futures, ids, timeout=None)
+
+def run_load(ids, trace, concurrency, speed):
+    """Executa o trace em malha aberta (speed > 0) ou fechada"""
+    if speed > 0:
+        return run_open_loop(ids, trace, concurrency, speed)
+    return run_closed_loop(ids, trace, concurrency)
+
+def split_evenly(total, parts):
+    """Divide um total inteiro em partes que diferem no máximo em 1"""
+    return [total // parts + (1 if k < total % parts else 0) for k in range(parts)]
 
-def save_logs(logs):
+def shard_path(worker_id):
+    return f"{LOG_DIR}/requests_log.shard{worker_id}.json"
+
+def send_key(log):
+    """Instante de envio planejado (malha aberta) ou efetivo"""
+    return log.get('intended_time', log.get('send_time', 0.0))
+
+def run_worker(worker_id, ids, trace, concurrency, speed, barrier):
+    """Processo worker: aguarda a barreira, gera carga e grava seu shard"""
+    open_stream()
+    barrier.wait(timeout=60)
+    logs = run_load(ids, trace, concurrency, speed)
+    logs.sort(key=send_key)
+    if not save_logs(logs, shard_path(worker_id)):
+        raise SystemExit(1)
+
+def run_coordinator(trace, n_workers, speed):
+    """Divide o trace entre N processos e une os shards por timestamp"""
+    concurrencies = split_evenly(CONCURRENT_CLIENTS, n_workers)
+    barrier = multiprocessing.Barrier(n_workers)
+    ids = np.arange(len(trace))
+    
+    for path in glob.glob(shard_path("*")):
+        os.remove(path)
+    
+    processes = []
+    for k in range(n_workers):
+        # Fatias intercaladas preservam a agenda global (e a taxa) do trace
+        p = multiprocessing.Process(
+            target=run_worker,
+            args=(k, ids[k::n_workers], trace[k::n_workers], concurrencies[k], speed, barrier)
+        )
+        p.start()
+        processes.append(p)
+    
+    for k, p in enumerate(processes):
+        p.join()
+        if p.exitcode != 0:
+            print(f"⚠ Worker {k} terminou com código {p.exitcode}")
+    
+    shards = []
+    for k in range(n_workers):
+        try:
+            with open(shard_path(k)) as f:
+                shards.append(json.load(f))
+            os.remove(shard_path(k))
+        except Exception as e:
+            print(f"⚠ Shard {k} indisponível: {str(e)}")
+    
+    return list(heapq.merge(*shards, key=send_key))
+
+def annotate_rates(logs, offered_rps):
+    """Registra taxa ofertada e taxa alcançada (respostas 200/s) em cada log"""
+    ok = [l for l in logs if l.get('status_code') == 200]
+    inicio = min(
+        (l.get('intended_time', l['send_time']) for l in logs if l.get('send_time')),
+        default=None
+    )
+    fim = max(
+        (l.get('intended_time', l['send_time']) + l['elapsed_time'] for l in ok),
+        default=None
+    )
+    achieved = None
+    if inicio is not None and fim is not None and fim > inicio:
+        achieved = round(len(ok) / (fim - inicio), 4)
+    
+    for l in logs:
+        l["offered_rps"] = offered_rps
+        l["achieved_rps"] = achieved
+    return achieved
+
+def quantiles_stable(previous, current, tolerance=RAMP_TOLERANCE):
+    """p50 e p99 de duas janelas consecutivas variam menos que a tolerância relativa"""
+    for p in (50, 99):
+        before, after = previous.percentile(p), current.percentile(p)
+        if abs(after - before) > tolerance * max(before, 1e-6):
+            return False
+    return True
+
+def run_ramp_step(step, level, rng, first_id):
+    """
+    Executa um degrau da rampa em janelas até os quantis estabilizarem.
+    
+    Cada janela usa tamanhos novos do mesmo gerador. O degrau termina quando
+    p50/p99 de duas janelas consecutivas ficam dentro de RAMP_TOLERANCE ou
+    após RAMP_MAX_WINDOWS janelas; o resumo usa as duas últimas janelas
+    (a primeira serve de aquecimento).
+    """
+    if RAMP_MODE == "concurrency":
+        concurrency, offered_rps, speed = int(level), None, 0.0
+        size = max(RAMP_WINDOW, 4 * concurrency)  # Todos os clientes ocupados na janela
+    else:
+        concurrency, offered_rps, speed = CONCURRENT_CLIENTS, level, 1.0
+        size = RAMP_WINDOW
+    
+    logs, windows = [], []
+    stable = False
+    while len(windows) < RAMP_MAX_WINDOWS:
+        ids = np.arange(first_id, first_id + size)
+        first_id += size
+        trace = np.zeros(size, dtype=TRACE_DTYPE)
+        trace['size'] = generate_file_sizes(size, rng)
+        if offered_rps is not None:
+            trace['offset'] = generate_schedule(size, offered_rps, rng)
+        
+        start = time.time()
+        window_logs = run_load(ids, trace, concurrency, speed)
+        duration = time.time() - start
+        for l in window_logs:
+            l.update(ramp_step=step, ramp_window=len(windows),
+                     concurrency=concurrency, offered_rps=offered_rps)
+        logs.extend(window_logs)
+        
+        hist = build_histogram(window_logs)
+        windows.append((hist, hist.total / duration if duration > 0 else 0.0, len(window_logs)))
+        if len(windows) > 1 and quantiles_stable(windows[-2][0], hist):
+            stable = True
+            break
+    
+    hist = LatencyHistogram()
+    for h, _, _ in windows[-2:]:
+        hist.merge(h)
+    requests = sum(n for _, _, n in windows[-2:])
+    throughput = float(np.mean([x for _, x, _ in windows[-2:]]))
+    mean = hist.summary()["mean"]
+    error_rate = 1 - hist.total / requests if requests else 1.0
+    summary = {
+        "step": step,
+        "concurrency": concurrency,
+        "offered_rps": offered_rps,
+        "windows": len(windows),
+        "stable": stable,
+        "requests": requests,
+        "error_rate": round(error_rate, 4),
+        "throughput_rps": round(throughput, 4),
+        "mean": mean,
+        "p50": hist.percentile(50),
+        "p99": hist.percentile(99),
+        "in_flight": round(throughput * mean, 4),  # Lei de Little: N = X·R
+        "within_slo": hist.percentile(99) <= SLO_P99 and error_rate <= SLO_ERROR_RATE
+    }
+    return logs, summary
+
+def run_ramp(rng):
+    """
+    Rampa adaptativa: aumenta a concorrência (malha fechada) ou a taxa
+    ofertada (malha aberta) de RAMP_STEP a cada degrau.
+    
+    Para quando o degrau viola o SLO (p99 > SLO_P99 ou erros acima de
+    SLO_ERROR_RATE) ou quando a vazão passa RAMP_PATIENCE degraus seguidos
+    sem crescer ao menos RAMP_MIN_GAIN sobre o melhor degrau anterior.
+    """
+    logs, steps = [], []
+    best = 0.0
+    stalled = 0
+    stop_reason = "max_steps"
+    for step in range(RAMP_MAX_STEPS):
+        level = RAMP_START + step * RAMP_STEP
+        print(f"▶ Degrau {step}: {RAMP_MODE} = {level:g}")
+        step_logs, summary = run_ramp_step(step, level, rng, len(logs))
+        logs.extend(step_logs)
+        steps.append(summary)
+        print(f"  vazão {summary['throughput_rps']:.1f} req/s | "
+              f"p50/p99 {summary['p50']:.4f}s / {summary['p99']:.4f}s | "
+              f"erros {summary['error_rate']:.1%}{'' if summary['stable'] else ' (instável)'}")
+        
+        if not summary["within_slo"]:
+            stop_reason = "slo"
+            break
+        if step > 0 and summary["throughput_rps"] < best * (1 + RAMP_MIN_GAIN):
+            stalled += 1
+            if stalled >= RAMP_PATIENCE:
+                stop_reason = "plateau"
+                break
+        else:
+            stalled = 0
+        best = max(best, summary["throughput_rps"])
+    
+    return logs, steps, stop_reason
+
+def save_ramp_summary(steps, stop_reason):
+    """Salva os degraus da rampa e a maior vazão sustentada dentro do SLO"""
+    within = [s for s in steps if s["within_slo"]]
+    best = max(within, key=lambda s: s["throughput_rps"], default=None)
+    try:
+        os.makedirs(LOG_DIR, exist_ok=True)
+        with open(RAMP_FILE, 'w') as f:
+            json.dump({
+                "ramp_mode": RAMP_MODE,
+                "slo_p99": SLO_P99,
+                "slo_error_rate": SLO_ERROR_RATE,
+                "stop_reason": stop_reason,
+                "max_sustainable": best,
+                "steps": steps
+            }, f, indent=4)
+        print(f"✓ Rampa salva em {RAMP_FILE} (parada: {stop_reason})")
+    except Exception as e:
+        print(f"✗ ERRO ao salvar rampa: {str(e)}")
+    return best
+
+def build_histogram(logs):
+    hist = LatencyHistogram()
+    for l in logs:
+        if l.get('status_code') == 200:
+            hist.record(l['elapsed_time'])
+    return hist
+
+def save_summary(hist, speed, offered_rps, achieved_rps):
+    """Salva o histograma de latência e as taxas do experimento"""
+    try:
+        os.makedirs(LOG_DIR, exist_ok=True)
+        with open(SUMMARY_FILE, 'w') as f:
+            json.dump({
+                "run_id": RUN_ID,
+                "load_mode": "open" if speed > 0 else "closed",
+                "ramp_mode": RAMP_MODE or None,
+                "arrival": ARRIVAL if LOAD_MODE == "open" else None,
+                "trace_mode": TRACE_MODE or None,
+                "replay_speed": REPLAY_SPEED if TRACE_MODE == "replay" else None,
+                "offered_rps": offered_rps,
+                "achieved_rps": achieved_rps,
+                "latency": hist.summary()
+            }, f, indent=4)
+    except Exception as e:
+        print(f"✗ ERRO ao salvar resumo: {str(e)}")
+
+def save_logs(logs, path=LOG_FILE):
     """Salva logs com verificação de integridade"""
     try:
         os.makedirs(LOG_DIR, exist_ok=True)
-        with open(LOG_FILE, 'w') as f:
+        with open(path, 'w') as f:
             json.dump(logs, f, indent=4, ensure_ascii=False)
             
-        print(f"✓ Logs salvos em {LOG_FILE}")
+        print(f"✓ Logs salvos em {path}")
         return True
         
     except Exception as e:
         print(f"✗ ERRO ao salvar logs: {str(e)}")
         return False
 
+def run_fixed_load():
+    """Carga fixa (malha fechada, aberta ou replay) com o trace do experimento"""
+    if TRACE_MODE == "replay":
+        trace = load_trace()
+        print(f"Trace: replay de {TRACE_FILE} ({len(trace)} req, {REPLAY_SPEED}x)")
+    else:
+        trace = generate_trace(TOTAL_REQUESTS, TRACE_SEED)
+        if TRACE_MODE == "record":
+            save_trace(trace)
+    
+    speed = replay_speed(trace)
+    if speed > 0:
+        # Taxa efetiva da agenda (igual a TARGET_RPS fora do replay)
+        span = float(trace['offset'][-1]) / speed
+        offered_rps = TARGET_RPS if TRACE_MODE != "replay" else round(len(trace) / span, 4)
+        print(f"Load: open ({offered_rps} req/s)\n")
+    else:
+        offered_rps = None
+        print("Load: closed\n")
+    
+    open_stream(truncate=True)
+    if CLIENT_PROCESSES > 1:
+        logs = run_coordinator(trace, CLIENT_PROCESSES, speed)
+    else:
+        logs = run_load(np.arange(len(trace)), trace, CONCURRENT_CLIENTS, speed)
+    
+    stream_log({"event": "done", "run_id": RUN_ID, "total": len(logs)})  # Marca o fim para o modo live
+    
+    achieved_rps = annotate_rates(logs, offered_rps)
+    hist = build_histogram(logs)
+    save_summary(hist, speed, offered_rps, achieved_rps)
+    return logs, hist, offered_rps, achieved_rps
+
 def main():
     """Fluxo principal com monitoramento detalhado"""
     print(f"\n=== INICIANDO CLIENTE ===")
-    print(f"Experiment ID: {EXPERIMENT_ID}")
+    print(f"Experiment ID: {EXPERIMENT_ID} (run {RUN_ID})")
     print(f"Requests: {TOTAL_REQUESTS}")
-    print(f"Concurrency: {CONCURRENT_CLIENTS}\n")
+    print(f"Concurrency: {CONCURRENT_CLIENTS}")
+    print(f"Processes: {CLIENT_PROCESSES}")
     
-    logs = []
+    if os.path.exists(RAMP_FILE):
+        os.remove(RAMP_FILE)  # Rampa de uma execução anterior: o analyzer a leria como atual
     
-    with ThreadPoolExecutor(max_workers=CONCURRENT_CLIENTS) as executor:
-        futures = [executor.submit(simulate_request, i) for i in range(TOTAL_REQUESTS)]
+    if RAMP_MODE:
+        print(f"Load: rampa de {RAMP_MODE} ({RAMP_START:g} + {RAMP_STEP:g}/degrau, SLO p99 {SLO_P99}s)\n")
+        open_stream(truncate=True)
+        logs, steps, stop_reason = run_ramp(np.random.default_rng(TRACE_SEED))
+        stream_log({"event": "done", "run_id": RUN_ID, "total": len(logs)})
         
-        for i, future in enumerate(futures):
-            try:
-                result = future.result(timeout=5)
-                logs.append(result)
-                
-                if (i+1) % 50 == 0:
-                    print(f"▶ Progresso: {i+1}/{TOTAL_REQUESTS}")
-                    
-            except Exception as e:
-                print(f"⚠ ERRO na requisição {i+1}: {str(e)}")
-                logs.append({
-                    "client_id": i,
-                    "error": str(e)
-                })
+        best = save_ramp_summary(steps, stop_reason)
+        hist = build_histogram(logs)
+        speed = 1.0 if RAMP_MODE == "rate" else 0.0
+        offered_rps = None
+        achieved_rps = best["throughput_rps"] if best else None
+        save_summary(hist, speed, offered_rps, achieved_rps)
+    else:
+        logs, hist, offered_rps, achieved_rps = run_fixed_load()
     
     if save_logs(logs):
         print(f"\n=== ESTATÍSTICAS ===")
         success = sum(1 for l in logs if l.get('status_code') == 200)
         errors = sum(1 for l in logs if l.get('error'))
         
-        print(f"Requisições bem-sucedidas: {success}/{TOTAL_REQUESTS}")
+        print(f"Requisições bem-sucedidas: {success}/{len(logs)}")
         print(f"Erros registrados: {errors}")
+        print(f"Taxa ofertada/alcançada: {offered_rps or '-'} / {achieved_rps} req/s")
+        print(f"Latência p50/p99: {hist.percentile(50):.4f}s / {hist.percentile(99):.4f}s")
         
         if logs:
             tamanho_medio = round(
                 sum(l['file_size'] for l in logs if l['file_size'] is not None) / 
-                max(1, TOTAL_REQUESTS), 
+                max(1, len(logs)), 
                 2
             )
             print(f"Tamanho médio: {tamanho_medio} KB")
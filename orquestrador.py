@@ -0,0 +1,277 @@
+# orquestrador.py
+"""
+Varredura de experimentos sem Docker: servidor, cliente e analyzer como
+processos locais.
+
+Cada ponto da grade TOTAL_REQS x CONCURRENT_CLIENTS x SERVER_WORKERS sobe um
+servidor novo, espera o /health responder, roda o cliente e dispara o
+analyzer em segundo plano enquanto o próximo teste de carga já começa.
+Todas as execuções ficam indexadas em <resultados>/index.json, que acumula
+as varreduras anteriores no mesmo diretório.
+
+Exemplo:
+    python orquestrador.py --reqs 500 5000 --clients 50 200 --workers 1 4
+"""
+import argparse
+import itertools
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+SERVER_SCRIPT = os.path.join(RAIZ, "server", "server.py")
+CLIENT_SCRIPT = os.path.join(RAIZ, "client", "client.py")
+ANALYZER_DIR = os.path.join(RAIZ, "analyzer")
+
+
+class IndiceResultados:
+    """
+    Índice único de resultados, regravado a cada mudança de estado.
+
+    Cada varredura acrescenta suas execuções às que já estão em index.json,
+    com chave EXPERIMENT_ID@início da varredura: repetir um ponto da grade
+    não apaga o registro da execução anterior.
+    """
+
+    def __init__(self, caminho, grade):
+        self.caminho = caminho
+        self.inicio = datetime.now().isoformat()
+        self.varredura = {"criado_em": self.inicio, "grade": grade}
+        self.execucoes = {}
+        self._lock = threading.Lock()
+        with self._lock:
+            self._gravar()
+
+    def carregar(self):
+        """Índice em disco; o formato antigo (uma varredura só) é convertido"""
+        dados = ler_json(self.caminho) or {}
+        if "varreduras" in dados:
+            return dados
+        convertido = {"varreduras": {}, "execucoes": {}}
+        if dados.get("execucoes"):
+            inicio = dados.get("criado_em", "desconhecido")
+            convertido["varreduras"][inicio] = {"criado_em": inicio, "grade": dados.get("grade")}
+            for experiment_id, execucao in dados["execucoes"].items():
+                convertido["execucoes"][f"{experiment_id}@{inicio}"] = dict(
+                    execucao, experiment_id=experiment_id, varredura=inicio
+                )
+        return convertido
+
+    def atualizar(self, experiment_id, **campos):
+        with self._lock:
+            self.execucoes.setdefault(
+                experiment_id, {"experiment_id": experiment_id, "varredura": self.inicio}
+            ).update(campos)
+            self._gravar()
+
+    def _gravar(self):
+        # Relê o disco a cada gravação: o que outra varredura gravou nesse
+        # meio-tempo é preservado, e só as entradas desta são sobrescritas
+        dados = self.carregar()
+        dados["varreduras"][self.inicio] = self.varredura
+        for experiment_id, execucao in self.execucoes.items():
+            dados["execucoes"][f"{experiment_id}@{self.inicio}"] = execucao
+        tmp = f"{self.caminho}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(dados, f, indent=4, ensure_ascii=False)
+        os.replace(tmp, self.caminho)
+
+
+def aguardar_health(url, processo, timeout, experiment_id):
+    """
+    Consulta /health até responder 200 (em vez de um sleep fixo).
+
+    O EXPERIMENT_ID devolvido precisa bater com o esperado: um servidor antigo
+    ainda ouvindo na porta não pode ser confundido com o recém-iniciado.
+    """
+    limite = time.time() + timeout
+    while time.time() < limite:
+        if processo.poll() is not None:
+            raise RuntimeError(f"Servidor encerrou durante a inicialização (código {processo.returncode})")
+        try:
+            with urllib.request.urlopen(url, timeout=1) as resposta:
+                if resposta.status == 200 and json.load(resposta).get("experiment") == experiment_id:
+                    return
+        except (OSError, ValueError):
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"Servidor não ficou saudável em {timeout}s")
+
+
+def encerrar_servidor(processo, timeout=30):
+    """SIGTERM permite ao modo multi-worker unir os shards de log"""
+    if processo.poll() is None:
+        processo.send_signal(signal.SIGTERM)
+        try:
+            processo.wait(timeout)
+        except subprocess.TimeoutExpired:
+            processo.kill()
+            processo.wait()
+
+
+def ler_json(caminho):
+    try:
+        with open(caminho) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def resumo_analise(dir_resultados):
+    """Extrai do resultado do analyzer o essencial para o índice"""
+    modelo = ler_json(os.path.join(dir_resultados, "modelo.json")) or {}
+    relatorio = ler_json(os.path.join(dir_resultados, "relatorio_validacao.json")) or {}
+    decomposicao = ler_json(os.path.join(dir_resultados, "decomposicao.json")) or {}
+    return {
+        "metodo": modelo.get("metodo"),
+        "metricas": modelo.get("metricas"),
+        "alertas": sum(1 for c in relatorio.get("checks", []) if c.get("status") != "OK"),
+        "dominante": decomposicao.get("resumo", {}).get("dominante")
+    }
+
+
+def rodar_analyzer(experiment_id, ambiente, dir_resultados, indice):
+    inicio = time.time()
+    with open(os.path.join(dir_resultados, "analyzer.out"), 'w') as saida:
+        codigo = subprocess.call(
+            [sys.executable, "curvas.py"], cwd=ANALYZER_DIR, env=ambiente,
+            stdout=saida, stderr=subprocess.STDOUT
+        )
+    indice.atualizar(
+        experiment_id,
+        analyzer={"codigo": codigo, "duracao_s": round(time.time() - inicio, 2)},
+        status="concluido" if codigo == 0 else "falha_analyzer",
+        **(resumo_analise(dir_resultados) if codigo == 0 else {})
+    )
+    print(f"  ↳ analyzer {experiment_id}: código {codigo}", flush=True)
+
+
+def iniciar_live(ambiente, dir_resultados):
+    """Analyzer live acompanhando o JSONL do cliente durante o teste de carga"""
+    saida = open(os.path.join(dir_resultados, "live.out"), 'w')
+    processo = subprocess.Popen(
+        [sys.executable, "live.py"], cwd=ANALYZER_DIR, env=ambiente,
+        stdout=saida, stderr=subprocess.STDOUT
+    )
+    saida.close()  # O processo filho mantém sua cópia do descritor
+    return processo
+
+
+def aguardar_live(processo, timeout=60):
+    """O live termina sozinho ao ler o marcador de fim do cliente"""
+    try:
+        return processo.wait(timeout)
+    except subprocess.TimeoutExpired:
+        processo.kill()
+        processo.wait()
+        return None
+
+
+def rodar_ponto(reqs, clients, workers, args, indice, pool, analises):
+    """Um ponto da grade: servidor novo, espera de saúde, carga e análise assíncrona"""
+    experiment_id = f"{args.prefixo}r{reqs}_c{clients}_w{workers}"
+    dir_resultados = os.path.join(args.resultados, experiment_id)
+    os.makedirs(dir_resultados, exist_ok=True)
+    indice.atualizar(experiment_id, total_reqs=reqs, concurrent_clients=clients,
+                     server_workers=workers, status="executando")
+
+    base = dict(os.environ, EXPERIMENT_ID=experiment_id)
+    ambiente_servidor = dict(
+        base, SERVER_WORKERS=str(workers), PORT=str(args.porta),
+        LOG_ROOT=args.logs, FILES_DIR=os.path.join(args.logs, ".files")
+    )
+    ambiente_cliente = dict(
+        base, TOTAL_REQS=str(reqs), CONCURRENT_CLIENTS=str(clients),
+        SERVER_URL=f"http://127.0.0.1:{args.porta}/file", OUTPUT_ROOT=args.logs
+    )
+    ambiente_analyzer = dict(base, INPUT_ROOT=args.logs, OUTPUT_ROOT=args.resultados)
+    # Nonce compartilhado: o live ignora linhas de execuções anteriores no mesmo JSONL
+    ambiente_cliente["RUN_ID"] = ambiente_analyzer["RUN_ID"] = uuid.uuid4().hex[:8]
+
+    print(f"▶ {experiment_id}", flush=True)
+    with open(os.path.join(dir_resultados, "server.out"), 'w') as saida_servidor:
+        servidor = subprocess.Popen(
+            [sys.executable, SERVER_SCRIPT], env=ambiente_servidor,
+            stdout=saida_servidor, stderr=subprocess.STDOUT
+        )
+        live = None
+        try:
+            inicio = time.time()
+            aguardar_health(f"http://127.0.0.1:{args.porta}/health", servidor,
+                             args.health_timeout, experiment_id)
+            pronto = time.time() - inicio
+
+            live = iniciar_live(ambiente_analyzer, dir_resultados) if args.live else None
+            inicio = time.time()
+            with open(os.path.join(dir_resultados, "client.out"), 'w') as saida_cliente:
+                codigo = subprocess.call(
+                    [sys.executable, CLIENT_SCRIPT], env=ambiente_cliente,
+                    stdout=saida_cliente, stderr=subprocess.STDOUT
+                )
+            indice.atualizar(experiment_id, servidor_pronto_s=round(pronto, 2),
+                             cliente={"codigo": codigo, "duracao_s": round(time.time() - inicio, 2)})
+            if live is not None:
+                indice.atualizar(experiment_id, live={"codigo": aguardar_live(live)})
+        except Exception as e:
+            indice.atualizar(experiment_id, status="falha_carga", erro=str(e))
+            print(f"  ✗ {experiment_id}: {str(e)}", flush=True)
+            return
+        finally:
+            if live is not None and live.poll() is None:
+                live.kill()
+                live.wait()
+            encerrar_servidor(servidor)
+
+    if codigo != 0:
+        indice.atualizar(experiment_id, status="falha_cliente")
+        return
+
+    # A análise roda em paralelo com o próximo teste de carga
+    indice.atualizar(experiment_id, status="analisando")
+    analises.append(pool.submit(
+        rodar_analyzer, experiment_id, ambiente_analyzer, dir_resultados, indice
+    ))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Varredura local de experimentos")
+    parser.add_argument("--reqs", type=int, nargs="+", default=[500, 5000], help="TOTAL_REQS")
+    parser.add_argument("--clients", type=int, nargs="+", default=[50, 200], help="CONCURRENT_CLIENTS")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1], help="SERVER_WORKERS")
+    parser.add_argument("--logs", default=os.path.join(RAIZ, "data", "logs"))
+    parser.add_argument("--resultados", default=os.path.join(RAIZ, "results"))
+    parser.add_argument("--prefixo", default="sweep_", help="Prefixo dos EXPERIMENT_IDs")
+    parser.add_argument("--porta", type=int, default=5000)
+    parser.add_argument("--health-timeout", type=float, default=30)
+    parser.add_argument("--analyzer-jobs", type=int, default=2, help="Analyzers simultâneos")
+    parser.add_argument("--live", action="store_true", help="Roda analyzer/live.py durante cada teste de carga")
+    args = parser.parse_args()
+    args.logs = os.path.abspath(args.logs)
+    args.resultados = os.path.abspath(args.resultados)
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    os.makedirs(args.resultados, exist_ok=True)
+    grade = {"total_reqs": args.reqs, "concurrent_clients": args.clients, "server_workers": args.workers}
+    indice = IndiceResultados(os.path.join(args.resultados, "index.json"), grade)
+
+    analises = []
+    with ThreadPoolExecutor(max_workers=args.analyzer_jobs) as pool:
+        for reqs, clients, workers in itertools.product(args.reqs, args.clients, args.workers):
+            rodar_ponto(reqs, clients, workers, args, indice, pool, analises)
+
+        print("Aguardando análises pendentes...", flush=True)
+        for analise in analises:
+            analise.result()
+
+    print(f"✅ Varredura concluída! Índice em {indice.caminho}")
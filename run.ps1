@@ -1,12 +1,14 @@
 param(
     [int]$TotalRequests = 500,
     [int]$ConcurrentClients = 50,
-    [string]$ExperimentID = "default"
+    [string]$ExperimentID = "default",
+    [int]$ServerWorkers = 1
 )
 
 $env:TOTAL_REQS = $TotalRequests
 $env:CONCURRENT_CLIENTS = $ConcurrentClients
 $env:EXPERIMENT_ID = $ExperimentID
+$env:SERVER_WORKERS = $ServerWorkers
 
 docker-compose down -v
 
@@ -14,4 +16,5 @@ docker-compose up --build
 
 Remove-Item Env:\TOTAL_REQS
 Remove-Item Env:\CONCURRENT_CLIENTS
-Remove-Item Env:\EXPERIMENT_ID
\ No newline at end of file
+Remove-Item Env:\EXPERIMENT_ID
+Remove-Item Env:\SERVER_WORKERS
\ No newline at end of file
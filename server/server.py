@@ -1,6 +1,12 @@
 from flask import Flask, request, send_file, jsonify
+from werkzeug.serving import make_server
+import glob
+import heapq
 import json
 import os
+import signal
+import socket
+import threading
 from datetime import datetime
 import random
 import time
@@ -9,10 +15,16 @@ import logging
 app = Flask(__name__)
 
 # Configurações
-LOG_DIR = "/app/logs"
-FILES_DIR = "files"
+EXPERIMENT_ID = os.getenv("EXPERIMENT_ID", "default")
+LOG_DIR = os.path.join(os.getenv("LOG_ROOT", "/app/logs"), EXPERIMENT_ID)
+FILES_DIR = os.path.abspath(os.getenv("FILES_DIR", "files"))  # send_file exige caminho absoluto fora de /app
 LOG_FILE = os.path.join(LOG_DIR, "server_logs.json")
 REQUEST_TIMEOUT = 3  # segundos
+HOST = "0.0.0.0"
+PORT = int(os.getenv("PORT", "5000"))
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "1"))  # 1 = servidor de desenvolvimento
+LISTEN_BACKLOG = int(os.getenv("LISTEN_BACKLOG", "1024"))
+WORKER_ID = None  # Definido em cada processo worker
 
 # Inicialização segura de diretórios
 os.makedirs(LOG_DIR, exist_ok=True)
@@ -31,18 +43,47 @@ logger = logging.getLogger(__name__)
 
 # Dados em memória para performance
 request_logs = []
+logs_lock = threading.Lock()  # Uma gravação por vez entre as threads do processo
 
-def save_server_logs():
-    """Salva logs formatados em arquivo com tratamento de erros"""
+def save_server_logs(logs=None, path=None):
+    """Salva logs formatados em arquivo com tratamento de erros.
+    
+    A gravação é serializada e atômica (arquivo temporário + os.replace):
+    leitores e um encerramento no meio da escrita nunca veem JSON parcial.
+    """
+    path = path or LOG_FILE
+    tmp_path = f"{path}.{os.getpid()}.tmp"
     try:
-        with open(LOG_FILE, 'w') as f:
-            json.dump({
-                "timestamp": datetime.now().isoformat(),
-                "requests": request_logs
-            }, f, indent=4)
+        with logs_lock:
+            with open(tmp_path, 'w') as f:
+                json.dump({
+                    "timestamp": datetime.now().isoformat(),
+                    "requests": request_logs if logs is None else logs
+                }, f, indent=4)
+            os.replace(tmp_path, path)
     except Exception as e:
         logger.error(f"Falha ao salvar logs: {str(e)}")
 
+def shard_path(worker_id):
+    """Caminho do shard de log de um worker"""
+    return os.path.join(LOG_DIR, f"server_logs.{worker_id}.json")
+
+def merge_log_shards():
+    """Une os shards dos workers em um único log ordenado por timestamp"""
+    shards = []
+    for path in sorted(glob.glob(shard_path("*"))):
+        try:
+            with open(path) as f:
+                shard = json.load(f).get("requests", [])
+            shards.append(sorted(shard, key=lambda r: r["timestamp"]))
+        except Exception as e:
+            logger.error(f"Shard ignorado ({path}): {str(e)}")
+
+    merged = list(heapq.merge(*shards, key=lambda r: r["timestamp"]))
+    save_server_logs(merged, LOG_FILE)
+    logger.info(f"{len(shards)} shards unidos em {LOG_FILE} ({len(merged)} registros)")
+    return merged
+
 def generate_dummy_file(size_kb):
     """Gera arquivo dummy otimizado com tamanho variável"""
     try:
@@ -51,8 +92,11 @@ def generate_dummy_file(size_kb):
         
         if not os.path.exists(file_path):
             start_gen = time.time()
-            with open(file_path, 'wb') as f:
+            # Escrita atômica: outros workers nunca leem um arquivo parcial
+            tmp_path = f"{file_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
                 f.write(os.urandom(varied_size * 1024))  # Gera bytes aleatórios
+            os.replace(tmp_path, file_path)
             logger.info(f"Arquivo {file_path} gerado em {time.time()-start_gen:.2f}s")
             
         return file_path, varied_size
@@ -67,6 +111,8 @@ def health_check():
     return jsonify({
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
+        "worker": WORKER_ID,
+        "experiment": EXPERIMENT_ID,
         "requests_processed": len(request_logs)
     }), 200
 
@@ -77,8 +123,10 @@ def handle_file_request(size_kb):
     client_ip = request.remote_addr
     log_data = {
         "client_ip": client_ip,
+        "request_id": request.headers.get("X-Request-ID"),
         "requested_size": size_kb,
         "timestamp": datetime.now().isoformat(),
+        "recv_time": start_time,
         "status": "failed"
     }
 
@@ -112,7 +160,10 @@ def handle_file_request(size_kb):
         return jsonify({"error": "Erro interno do servidor"}), 500
         
     finally:
-        save_server_logs()
+        # Pré-fork: o worker grava o shard ao encerrar; regravá-lo a cada
+        # requisição entraria na latência medida pelo cliente
+        if WORKER_ID is None:
+            save_server_logs()
 
 def clean_old_files():
     """Limpeza periódica de arquivos gerados"""
@@ -125,16 +176,85 @@ def clean_old_files():
     except Exception as e:
         logger.error(f"Erro na limpeza de arquivos: {str(e)}")
 
+def run_worker(worker_id, fd):
+    """Loop de um worker: atende no socket herdado e grava seu próprio shard"""
+    global LOG_FILE, WORKER_ID
+    WORKER_ID = worker_id
+    LOG_FILE = shard_path(worker_id)
+    request_logs.clear()
+    
+    def parar(signum, frame):
+        raise KeyboardInterrupt  # Interrompe serve_forever na thread principal
+    
+    signal.signal(signal.SIGTERM, parar)
+    
+    server = make_server(HOST, PORT, app, threaded=True, fd=fd)
+    logger.info(f"Worker {worker_id} (pid {os.getpid()}) pronto")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Shard final com tudo o que está em memória (espera gravações em curso).
+        # Um segundo sinal (o pai repassa o SIGTERM; Ctrl+C atinge o grupo
+        # todo) interromperia a gravação do único shard do worker
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        save_server_logs()
+        logger.info(f"Worker {worker_id}: {len(request_logs)} registros gravados")
+
+def run_prefork(n_workers):
+    """Pré-fork de N workers compartilhando a mesma porta"""
+    # Shards e log unido de execuções anteriores: o analyzer prefere o log
+    # unido e, se sobrasse um antigo, juntaria o cliente a registros velhos
+    for path in glob.glob(shard_path("*")) + [LOG_FILE]:
+        if os.path.exists(path):
+            os.remove(path)
+    
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((HOST, PORT))
+    sock.listen(LISTEN_BACKLOG)
+    sock.set_inheritable(True)
+    
+    children = []
+    for worker_id in range(n_workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(worker_id, sock.fileno())
+            finally:
+                os._exit(0)
+        children.append(pid)
+    sock.close()
+    
+    def encerrar(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    
+    signal.signal(signal.SIGTERM, encerrar)
+    signal.signal(signal.SIGINT, encerrar)
+    
+    for pid in children:
+        os.waitpid(pid, 0)
+    merge_log_shards()
+
 if __name__ == "__main__":
     clean_old_files()
     try:
-        logger.info("Iniciando servidor...")
-        app.run(
-            host="0.0.0.0",
-            port=5000,
-            threaded=True,
-            use_reloader=False
-        )
+        logger.info(f"Iniciando servidor ({SERVER_WORKERS} worker(s))...")
+        if SERVER_WORKERS > 1:
+            run_prefork(SERVER_WORKERS)
+        else:
+            app.run(
+                host=HOST,
+                port=PORT,
+                threaded=True,
+                use_reloader=False
+            )
     except Exception as e:
         logger.critical(f"Falha crítica no servidor: {str(e)}")
         raise
\ No newline at end of file